@@ -2,6 +2,7 @@
 DT-Study-Companion 主API服务
 """
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
@@ -10,16 +11,18 @@ import uvicorn
 from loguru import logger
 
 # 导入模块
-from .database import get_db, init_database
+from .database import get_db, init_database, SessionLocal
 from .models import User
 from .auth import get_current_user, security
 from .schemas import (
-    QueryRequest, QueryResponse, SystemInfo, HealthCheck,
+    QueryRequest, QueryResponse, SystemInfo, HealthCheck, ReadinessCheck,
     UserLoginRequest, UserLoginResponse, UserRegisterRequest,
     AgentListResponse, AgentInfo, UserProfile, UserStats
 )
 from .services.user_service import UserService
 from .services.agent_service import AgentService
+from .services.query_executor import query_executor, QueryOverloaded, QueryUnavailable
+from src.utils.config import Config
 try:
     from ..src.workflow.agent_graph import TextbookAssistant
 except ImportError:
@@ -27,7 +30,7 @@ except ImportError:
     class TextbookAssistant:
         def __init__(self):
             pass
-        def query(self, query):
+        def query(self, query, search_books=None):
             return {
                 "answer": "系统正在初始化中，请稍后重试",
                 "sources": [],
@@ -36,6 +39,10 @@ except ImportError:
                 "version": "",
                 "question": query
             }
+        def warm_up(self, books):
+            return False
+        def warmup_progress(self):
+            return {"status": "unavailable", "ready": False}
 
 # 安全方案从auth模块导入
 
@@ -56,12 +63,25 @@ async def lifespan(app: FastAPI):
     # 初始化课本助手
     assistant = TextbookAssistant()
     
+    # 按查询历史后台预热热门collection，完成前/ready返回503
+    books = []
+    if Config.WARMUP_TOP_N > 0:
+        db = SessionLocal()
+        try:
+            books = user_service.get_popular_books(db, Config.WARMUP_TOP_N, Config.WARMUP_HISTORY_DAYS)
+        except Exception as e:
+            logger.warning(f"读取热门书籍失败，跳过collection预热: {e}")
+        finally:
+            db.close()
+    assistant.warm_up(books)
+    
     logger.info("DT-Study-Companion初始化完成")
     
     yield
     
     # 关闭时清理
     logger.info("DT-Study-Companion正在关闭...")
+    query_executor.shutdown()
 
 # 创建FastAPI应用
 app = FastAPI(
@@ -313,8 +333,16 @@ async def query(
                 elif version == "5":
                     query_text = f"社会医学第五版，{request.query}"
         
-        # 执行查询
-        result = assistant.query(query_text)
+        # 综合类Agent覆盖多本书，需要跨collection检索
+        search_books = None
+        agent = agent_service.get_agent_by_name(db, agent_name)
+        if agent:
+            books = agent_service.get_agent_config(agent).get("books", [])
+            if len(books) > 1:
+                search_books = books
+        
+        # 执行查询（在查询线程池中运行，不阻塞事件循环）
+        result = await query_executor.run(assistant.query, query_text, search_books=search_books)
         
         # 保存查询历史
         user_service.add_query_history(
@@ -337,6 +365,14 @@ async def query(
             question=result["question"]
         )
         
+    except QueryOverloaded as e:
+        logger.warning(f"查询被拒绝: {e}")
+        raise HTTPException(status_code=429, detail="请求过多，请稍后重试", headers={"Retry-After": "5"})
+    except QueryUnavailable as e:
+        logger.warning(f"查询未执行: {e}")
+        raise HTTPException(status_code=503, detail="服务繁忙，请稍后重试", headers={"Retry-After": "10"})
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"查询执行失败: {e}")
         raise HTTPException(status_code=500, detail="查询失败")
@@ -349,21 +385,34 @@ async def get_system_info():
     try:
         try:
             from ..src.preprocessing.vectorstore_builder import VectorStoreBuilder
-            builder = VectorStoreBuilder()
-            collections = builder.list_collections()
+            from ..src.vectorstore.embeddings import embedding_registry
+            from ..src.vectorstore.micro_batcher import query_batcher_stats
+            from ..src.workflow.answer_cache import answer_cache
+            # 只列目录，不会触发Embedding模型加载
+            collections = VectorStoreBuilder().list_collections()
             total_books = len(set([c.split('_v')[0] for c in collections]))
             total_collections = len(collections)
+            embedding_models = embedding_registry.stats()
+            answer_cache_stats = answer_cache.stats()
+            query_batcher = query_batcher_stats()
         except ImportError:
             # 如果导入失败，使用默认值
             total_books = 0
             total_collections = 0
+            embedding_models = []
+            answer_cache_stats = {}
+            query_batcher = []
         
         return SystemInfo(
             total_books=total_books,
             total_collections=total_collections,
             available_books=[],  # 这里可以添加具体的书籍信息
             embedding_model="BAAI/bge-large-zh-v1.5",
-            llm_model="gpt-4-turbo-preview"
+            llm_model="gpt-4-turbo-preview",
+            embedding_models=embedding_models,
+            answer_cache=answer_cache_stats,
+            query_batcher=query_batcher,
+            query_executor=query_executor.stats()
         )
         
     except Exception as e:
@@ -378,6 +427,20 @@ async def health_check():
         message="DT-Study-Companion运行正常"
     )
 
+@app.get("/ready", response_model=ReadinessCheck)
+async def readiness_check():
+    """就绪检查：预热完成前返回503，负载均衡据此只把流量转给已预热的实例"""
+    progress = assistant.warmup_progress() if assistant else {"status": "starting", "ready": False}
+    readiness = ReadinessCheck(
+        status=progress["status"],
+        ready=progress["ready"],
+        warmup=progress
+    )
+    return JSONResponse(
+        status_code=200 if readiness.ready else 503,
+        content=readiness.model_dump()
+    )
+
 # ===== 根路径 =====
 
 @app.get("/")
@@ -15,6 +15,10 @@ from loguru import logger
 from src.preprocessing.vectorstore_builder import VectorStoreBuilder
 from src.agents.rag_agent import RAGAgent
 from src.utils.config import Config
+from src.vectorstore.micro_batcher import query_batcher_stats
+from src.vectorstore.query_cache import query_embedding_cache
+from src.vectorstore.reranker import reranker
+from src.vectorstore.result_cache import retrieval_cache
 
 app = FastAPI(
     title="DT Study Companion RAG API",
@@ -25,6 +29,9 @@ app = FastAPI(
 # 全局变量存储RAG代理
 rag_agents: Dict[str, RAGAgent] = {}
 
+# 共享的向量库构建器（Embedding模型在进程内只加载一次）
+vectorstore_builder = VectorStoreBuilder()
+
 class QueryRequest(BaseModel):
     """查询请求模型"""
     question: str
@@ -50,8 +57,7 @@ def get_rag_agent(collection_name: str) -> RAGAgent:
     """获取RAG代理"""
     if collection_name not in rag_agents:
         # 尝试加载向量数据库
-        builder = VectorStoreBuilder()
-        vectorstore = builder.get_vectorstore(collection_name)
+        vectorstore = vectorstore_builder.get_vectorstore(collection_name)
         
         if not vectorstore:
             raise HTTPException(
@@ -76,8 +82,7 @@ async def startup_event():
         raise Exception("配置验证失败")
     
     # 预加载可用的collections
-    builder = VectorStoreBuilder()
-    collections = builder.list_collections()
+    collections = vectorstore_builder.list_collections()
     
     logger.info(f"发现 {len(collections)} 个可用的collections:")
     for collection in collections:
@@ -97,8 +102,7 @@ async def root():
 @app.get("/collections", response_model=List[CollectionInfo])
 async def list_collections():
     """列出所有可用的collections"""
-    builder = VectorStoreBuilder()
-    collections = builder.list_collections()
+    collections = vectorstore_builder.list_collections()
     
     collection_infos = []
     for collection_name in collections:
@@ -134,8 +138,7 @@ async def query_documents(request: QueryRequest):
     try:
         # 如果没有指定collection，使用第一个可用的
         if not request.collection_name:
-            builder = VectorStoreBuilder()
-            collections = builder.list_collections()
+            collections = vectorstore_builder.list_collections()
             if not collections:
                 raise HTTPException(
                     status_code=404, 
@@ -179,7 +182,11 @@ async def health_check():
     return {
         "status": "healthy",
         "collections_count": len(rag_agents),
-        "available_collections": list(rag_agents.keys())
+        "available_collections": list(rag_agents.keys()),
+        "query_cache": query_embedding_cache.stats(),
+        "query_batcher": query_batcher_stats(),
+        "reranker": reranker.stats(),
+        "retrieval_cache": retrieval_cache.stats()
     }
 
 if __name__ == "__main__":
@@ -1,7 +1,7 @@
 """
 用户服务模块
 """
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from ..models import User, QueryHistory
@@ -147,3 +147,20 @@ class UserService:
             "recent_queries": recent_queries,
             "popular_books": [{"name": book[0], "count": book[1]} for book in popular_books]
         }
+    
+    def get_popular_books(self, db: Session, limit: int = 5, days: int = 30) -> List[Tuple[str, str]]:
+        """全体用户最近days天内查询最多的 (书名, 版本)，按查询次数降序"""
+        from datetime import datetime, timedelta
+        from sqlalchemy import func
+        since = datetime.utcnow() - timedelta(days=days)
+        rows = db.query(
+            QueryHistory.book_name,
+            QueryHistory.version,
+            func.count(QueryHistory.id).label('count')
+        ).filter(
+            QueryHistory.created_at >= since,
+            QueryHistory.book_name.isnot(None),
+            QueryHistory.book_name != ""
+        ).group_by(QueryHistory.book_name, QueryHistory.version).order_by(desc('count')).limit(limit).all()
+        
+        return [(row[0], row[1] or "") for row in rows]
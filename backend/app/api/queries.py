@@ -8,6 +8,17 @@ from loguru import logger
 
 router = APIRouter()
 
+# 共享的向量库构建器，首次请求时创建（Embedding模型在进程内只加载一次）
+_vectorstore_builder = None
+
+def _get_vectorstore_builder():
+    """获取共享的向量库构建器"""
+    global _vectorstore_builder
+    if _vectorstore_builder is None:
+        from src.preprocessing.vectorstore_builder import VectorStoreBuilder
+        _vectorstore_builder = VectorStoreBuilder()
+    return _vectorstore_builder
+
 class QueryRequest(BaseModel):
     """查询请求模型"""
     question: str
@@ -37,10 +48,9 @@ async def ask_question(request: QueryRequest):
         
         try:
             from src.agents.rag_agent import RAGAgent
-            from src.preprocessing.vectorstore_builder import VectorStoreBuilder
             
             # 获取向量数据库
-            builder = VectorStoreBuilder()
+            builder = _get_vectorstore_builder()
             collection_name = request.collection_name or "docx_卫生统计学第八版"
             vectorstore = builder.get_vectorstore(collection_name)
             
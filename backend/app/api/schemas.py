@@ -88,8 +88,18 @@ class SystemInfo(BaseModel):
     available_books: List[BookInfo]
     embedding_model: str
     llm_model: str
+    embedding_models: List[Dict[str, Any]] = Field(default_factory=list, description="已加载的Embedding模型（加载耗时、内存、引用计数）")
+    answer_cache: Dict[str, Any] = Field(default_factory=dict, description="语义答案缓存统计（命中率、各条目命中次数）")
+    query_batcher: List[Dict[str, Any]] = Field(default_factory=list, description="查询编码微批处理指标（每批问题数、排队等待时间直方图）")
+    query_executor: Dict[str, Any] = Field(default_factory=dict, description="查询执行器指标（并发、排队、拒绝数、排队等待时间）")
 
 class HealthCheck(BaseModel):
     """健康检查"""
     status: str
-    message: str
\ No newline at end of file
+    message: str
+
+class ReadinessCheck(BaseModel):
+    """就绪检查"""
+    status: str
+    ready: bool
+    warmup: Dict[str, Any] = Field(default_factory=dict, description="预热进度（目标collection、已完成、失败、当前处理项）")
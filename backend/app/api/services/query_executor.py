@@ -0,0 +1,147 @@
+"""
+查询执行器 - 在独立线程池中运行同步的问答流程，限制并发和排队深度
+"""
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+from loguru import logger
+from src.utils.config import Config
+
+class QueryOverloaded(Exception):
+    """排队已满，拒绝新查询"""
+
+class QueryUnavailable(Exception):
+    """暂时无法执行查询（排队超时或执行器已关闭）"""
+
+class QueryQueueTimeout(QueryUnavailable):
+    """排队等待超时"""
+
+class QueryExecutor:
+    """
+    查询执行器
+
+    问答流程包含模型推理、向量库I/O和阻塞的LLM请求，直接在事件循环里调用会卡住
+    同一worker上的所有请求。这里把它放到固定大小的线程池中执行：
+    执行中+排队中的查询超过 max_workers + max_queue 时立即拒绝；
+    排队时间超过queue_timeout的查询在开始执行前放弃。
+    """
+
+    # 排队等待时间直方图的桶上限（秒）
+    WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, float("inf"))
+
+    def __init__(self,
+                 max_workers: int = None,
+                 max_queue: int = None,
+                 queue_timeout: float = None):
+        self.max_workers = Config.QUERY_MAX_WORKERS if max_workers is None else max_workers
+        self.max_queue = Config.QUERY_MAX_QUEUE if max_queue is None else max_queue
+        self.queue_timeout = Config.QUERY_QUEUE_TIMEOUT if queue_timeout is None else queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="query-worker")
+        self._lock = threading.Lock()
+        self.pending = 0  # 排队中+执行中
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._wait_counts = [0] * len(self.WAIT_BUCKETS)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        在线程池中执行func，不阻塞事件循环
+
+        Raises:
+            QueryOverloaded: 排队已满
+            QueryUnavailable: 排队超时或执行器已关闭
+        """
+        with self._lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                self.rejected += 1
+                raise QueryOverloaded(f"查询排队已满 ({self.pending})")
+            self.pending += 1
+
+        call = functools.partial(func, *args, **kwargs)
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._executor, self._execute, time.perf_counter(), call)
+        except RuntimeError:
+            with self._lock:
+                self.pending -= 1
+            raise QueryUnavailable("查询执行器已关闭")
+        return await future
+
+    def _execute(self, enqueued_at: float, call: Callable[[], Any]) -> Any:
+        """工作线程入口：记录排队时间，超时的查询直接放弃"""
+        wait = time.perf_counter() - enqueued_at
+        try:
+            with self._lock:
+                self._record_wait(wait)
+                if self.queue_timeout > 0 and wait > self.queue_timeout:
+                    self.timed_out += 1
+                    raise QueryQueueTimeout(f"查询排队 {wait:.1f}s 超时")
+                self.running += 1
+
+            try:
+                result = call()
+                with self._lock:
+                    self.completed += 1
+                return result
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                raise
+            finally:
+                with self._lock:
+                    self.running -= 1
+        finally:
+            # 请求方断开后任务仍会执行完，计数在工作线程里释放
+            with self._lock:
+                self.pending -= 1
+
+    def _record_wait(self, wait: float):
+        """记录排队时间（调用方持有锁）"""
+        for i, bound in enumerate(self.WAIT_BUCKETS):
+            if wait <= bound:
+                self._wait_counts[i] += 1
+                break
+        self._wait_total += wait
+        self._wait_max = max(self._wait_max, wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """执行器指标（排队等待时间为累计直方图）"""
+        with self._lock:
+            samples = sum(self._wait_counts)
+            cumulative = 0
+            histogram = {}
+            for bound, count in zip(self.WAIT_BUCKETS, self._wait_counts):
+                cumulative += count
+                histogram["+Inf" if bound == float("inf") else str(bound)] = cumulative
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self.running,
+                "queued": self.pending - self.running,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "queue_wait": {
+                    "count": samples,
+                    "avg": self._wait_total / samples if samples else 0.0,
+                    "max": self._wait_max,
+                    "buckets": histogram
+                }
+            }
+
+    def shutdown(self):
+        """停止接收新任务（已提交的任务继续执行完）"""
+        logger.info("查询执行器正在关闭")
+        self._executor.shutdown(wait=False)
+
+# 全局查询执行器
+query_executor = QueryExecutor()
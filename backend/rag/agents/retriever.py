@@ -1,8 +1,16 @@
 """检索Agent"""
+import heapq
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import List, Dict, Any, Optional
+import numpy as np
 from loguru import logger
 from ..preprocessing.vectorstore_builder import VectorStoreBuilder
 from ..utils.config import Config
+from ..vectorstore.chunk_store import join_chunks
+from ..vectorstore.diversity import maximal_marginal_relevance
+from ..vectorstore.lexical_index import LexicalIndex, reciprocal_rank_fusion
+from ..vectorstore.reranker import reranker
+from ..vectorstore.result_cache import retrieval_cache
 
 class RetrieverAgent:
     """检索Agent - 从向量数据库中检索相关文档"""
@@ -11,13 +19,23 @@ class RetrieverAgent:
         self.vectorstore_builder = VectorStoreBuilder()
         self.top_k = Config.RETRIEVAL_TOP_K
         self.score_threshold = Config.RETRIEVAL_SCORE_THRESHOLD
+        self.retrieval_mode = Config.RETRIEVAL_MODE
+        self.mmr_fetch_k = Config.RETRIEVAL_MMR_FETCH_K
+        self.mmr_lambda = Config.RETRIEVAL_MMR_LAMBDA
+        self.dedup_threshold = Config.RETRIEVAL_DEDUP_THRESHOLD
+        self.rerank_enabled = Config.RERANK_ENABLED
+        self.chapter_top_n = Config.CHAPTER_ROUTING_TOP_N
+        self.expand_window = Config.RETRIEVAL_EXPAND_WINDOW
     
     def retrieve(self, 
                 collection_name: str, 
                 question: str, 
                 version: str = None,
                 top_k: int = None,
-                score_threshold: float = None) -> List[Dict[str, Any]]:
+                score_threshold: float = None,
+                mode: str = None,
+                rerank: bool = None,
+                expand_window: int = None) -> List[Dict[str, Any]]:
         """
         检索相关文档
         
@@ -27,64 +45,620 @@ class RetrieverAgent:
             version: 版本号（用于二次验证）
             top_k: 返回文档数量
             score_threshold: 相似度阈值
+            mode: 检索模式 dense/hybrid/lexical，默认使用Config.RETRIEVAL_MODE；
+                  collection没有BM25索引时自动退回dense
+            rerank: 是否用交叉编码器重排序，默认使用Config.RERANK_ENABLED；
+                    先召回RERANK_FETCH_K个候选，重排后取top_k
+            expand_window: 命中文本块前后各扩展的相邻块数，默认使用Config.RETRIEVAL_EXPAND_WINDOW；
+                           0表示不扩展
             
         Returns:
             检索到的文档列表
         """
         logger.info(f"检索文档: collection={collection_name}, 问题={question}")
-        
+        return self._retrieve_collection(
+            collection_name, question, version, top_k, score_threshold, mode, rerank, expand_window
+        )
+    
+    def _retrieve_collection(self,
+                             collection_name: str,
+                             question: str,
+                             version: str = None,
+                             top_k: int = None,
+                             score_threshold: float = None,
+                             mode: str = None,
+                             rerank: bool = None,
+                             expand_window: int = None,
+                             query_embedding: List[float] = None) -> List[Dict[str, Any]]:
+        """单个collection的检索流程（参数同retrieve），query_embedding为已编码的问题向量"""
         # 使用配置的默认值
         if top_k is None:
             top_k = self.top_k
         if score_threshold is None:
             score_threshold = self.score_threshold
+        if mode is None:
+            mode = self.retrieval_mode
+        if rerank is None:
+            rerank = self.rerank_enabled
+        if expand_window is None:
+            expand_window = self.expand_window
+        fetch_k = max(top_k, Config.RERANK_FETCH_K) if rerank else top_k
+        
+        # 结果只取决于这些参数；collection变化后代数递增，旧结果自动作废
+        cache_key = retrieval_cache.key(
+            collection_name, question, version, top_k, score_threshold, mode, rerank, expand_window
+        )
+        cached = retrieval_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"✓ 命中检索结果缓存: {len(cached)} 个相关文档")
+            return [dict(result) for result in cached]
+        generation = retrieval_cache.generation(collection_name)
         
         try:
+            lexical_index = None
+            if mode in ("hybrid", "lexical"):
+                lexical_index = self.vectorstore_builder.get_lexical_index(collection_name)
+            
             # 获取向量数据库
             vectorstore = self.vectorstore_builder.get_vectorstore(collection_name)
             if not vectorstore:
                 logger.warning(f"Collection不存在: {collection_name}")
                 return []
             
+            if query_embedding is None:
+                query_embedding = self.vectorstore_builder.embed_queries([question])[0]
+            
+            # 仅BM25的快速模式：不做向量检索，只为命中的文本块补算相似度
+            if mode == "lexical" and lexical_index:
+                results = self._lexical_search(lexical_index, question, version, fetch_k)
+                self._score_lexical_hits(vectorstore, collection_name, query_embedding, results)
+                if rerank:
+                    results = reranker.rerank(question, results, top_k)
+                if expand_window > 0:
+                    results = self._expand_neighbors(collection_name, results, expand_window)
+                logger.info(f"✓ BM25检索完成: 找到 {len(results)} 个相关文档")
+                retrieval_cache.put(cache_key, [dict(result) for result in results], generation)
+                return results
+            
             # 执行相似度搜索
-            docs_with_scores = vectorstore.similarity_search_with_score(
-                question, 
-                k=top_k
-            )
+            # 版本过滤下推为where条件，一次查询即可拿到k个同版本文档
+            hits = self._dense_search(
+                vectorstore,
+                [query_embedding],
+                fetch_k,
+                score_threshold,
+                where=self._version_filter(version),
+                collection_name=collection_name
+            )[0]
             
             # 处理检索结果
-            results = []
-            for doc, score in docs_with_scores:
-                # 计算相似度分数（ChromaDB返回的是距离，需要转换为相似度）
-                similarity_score = 1 / (1 + score)
-                
-                # 过滤低相似度文档
-                if similarity_score < score_threshold:
-                    continue
-                
-                # 二次验证版本号（如果提供了版本）
-                if version and doc.metadata.get("version") != version:
-                    logger.warning(f"版本不匹配: 期望{version}, 实际{doc.metadata.get('version')}")
-                    continue
-                
-                result = {
-                    "content": doc.page_content,
-                    "metadata": doc.metadata,
-                    "score": similarity_score
-                }
-                results.append(result)
+            results = self._process_dense_hits(hits, version, score_threshold)
             
-            logger.info(f"✓ 检索完成: 找到 {len(results)} 个相关文档")
+            if lexical_index:
+                lexical_results = self._lexical_search(lexical_index, question, version, fetch_k)
+                results = self._fuse_results(results, lexical_results, fetch_k)
+                self._score_lexical_hits(vectorstore, collection_name, query_embedding, results)
             
-            # 按相似度排序
-            results.sort(key=lambda x: x["score"], reverse=True)
+            if rerank:
+                results = reranker.rerank(question, results, top_k)
+            
+            if expand_window > 0:
+                results = self._expand_neighbors(collection_name, results, expand_window)
             
+            logger.info(f"✓ 检索完成: 找到 {len(results)} 个相关文档")
+            
+            retrieval_cache.put(cache_key, [dict(result) for result in results], generation)
             return results
             
         except Exception as e:
             logger.error(f"✗ 文档检索失败: {e}")
             return []
     
+    def retrieve_many(self,
+                      collection_name: str,
+                      questions: List[str],
+                      version: str = None,
+                      top_k: int = None,
+                      score_threshold: float = None,
+                      mode: str = None,
+                      rerank: bool = None,
+                      expand_window: int = None) -> List[List[Dict[str, Any]]]:
+        """
+        批量检索（适用于整套题目的批量处理）
+        
+        所有问题一次性批量编码，再用一次collection查询取回全部结果，
+        每个问题的结果格式与retrieve相同。
+        
+        Args:
+            collection_name: collection名称
+            questions: 问题列表
+            version: 版本号（用于二次验证）
+            top_k: 每个问题返回的文档数量
+            score_threshold: 相似度阈值
+            mode: 检索模式，同retrieve
+            rerank: 是否重排序，同retrieve（时间预算按单个问题计算）
+            expand_window: 命中文本块前后各扩展的相邻块数，同retrieve
+            
+        Returns:
+            与questions一一对应的检索结果列表
+        """
+        logger.info(f"批量检索: collection={collection_name}, 问题数={len(questions)}")
+        
+        if not questions:
+            return []
+        if top_k is None:
+            top_k = self.top_k
+        if score_threshold is None:
+            score_threshold = self.score_threshold
+        if mode is None:
+            mode = self.retrieval_mode
+        if rerank is None:
+            rerank = self.rerank_enabled
+        if expand_window is None:
+            expand_window = self.expand_window
+        fetch_k = max(top_k, Config.RERANK_FETCH_K) if rerank else top_k
+        
+        try:
+            lexical_index = None
+            if mode in ("hybrid", "lexical"):
+                lexical_index = self.vectorstore_builder.get_lexical_index(collection_name)
+            
+            vectorstore = self.vectorstore_builder.get_vectorstore(collection_name)
+            if not vectorstore:
+                logger.warning(f"Collection不存在: {collection_name}")
+                return [[] for _ in questions]
+            
+            # 一次前向计算编码全部问题
+            query_embeddings = self.vectorstore_builder.embed_queries(questions)
+            
+            if mode == "lexical" and lexical_index:
+                all_results = [
+                    self._lexical_search(lexical_index, question, version, fetch_k)
+                    for question in questions
+                ]
+                for query_embedding, results in zip(query_embeddings, all_results):
+                    self._score_lexical_hits(vectorstore, collection_name, query_embedding, results)
+                if rerank:
+                    all_results = [
+                        reranker.rerank(question, results, top_k)
+                        for question, results in zip(questions, all_results)
+                    ]
+                if expand_window > 0:
+                    all_results = [
+                        self._expand_neighbors(collection_name, results, expand_window)
+                        for results in all_results
+                    ]
+                return all_results
+            
+            # 一次查询取回全部结果
+            all_hits = self._dense_search(
+                vectorstore,
+                query_embeddings,
+                fetch_k,
+                score_threshold,
+                where=self._version_filter(version),
+                collection_name=collection_name
+            )
+            
+            all_results = []
+            for question, query_embedding, hits in zip(questions, query_embeddings, all_hits):
+                results = self._process_dense_hits(hits, version, score_threshold)
+                if lexical_index:
+                    lexical_results = self._lexical_search(lexical_index, question, version, fetch_k)
+                    results = self._fuse_results(results, lexical_results, fetch_k)
+                    self._score_lexical_hits(vectorstore, collection_name, query_embedding, results)
+                if rerank:
+                    results = reranker.rerank(question, results, top_k)
+                if expand_window > 0:
+                    results = self._expand_neighbors(collection_name, results, expand_window)
+                all_results.append(results)
+            
+            logger.info(f"✓ 批量检索完成: {len(questions)} 个问题")
+            return all_results
+            
+        except Exception as e:
+            logger.error(f"✗ 批量检索失败: {e}")
+            return [[] for _ in questions]
+    
+    def retrieve_across(self,
+                        collection_names: List[str],
+                        question: str,
+                        top_k: int = None,
+                        score_threshold: float = None,
+                        mode: str = None,
+                        rerank: bool = None,
+                        expand_window: int = None,
+                        timeout: float = None) -> List[Dict[str, Any]]:
+        """
+        跨多个collection并发检索，合并为全局top-k
+        
+        问题只编码一次，每个collection走与retrieve相同的检索流程（检索模式、重排序、
+        相邻块扩展和检索结果缓存），各占一个线程同时开始；超过timeout仍未返回的
+        collection直接丢弃，总耗时约等于最慢的单个collection而不是全部之和。
+        各版本号不同，因此不做版本二次验证，结果的metadata中带collection_name。
+        
+        Args:
+            collection_names: collection名称列表
+            question: 查询问题
+            top_k: 返回文档数量（全局）
+            score_threshold: 相似度阈值
+            mode: 检索模式，同retrieve
+            rerank: 是否重排序，同retrieve；全部结果都带rerank_score时按重排分数合并
+            expand_window: 命中文本块前后各扩展的相邻块数，同retrieve
+            timeout: 单个collection的超时时间（秒），默认Config.FANOUT_TIMEOUT
+            
+        Returns:
+            按相似度（或重排分数）降序的全局top-k文档
+        """
+        logger.info(f"跨collection检索: collections={collection_names}, 问题={question}")
+        
+        if not collection_names:
+            return []
+        if top_k is None:
+            top_k = self.top_k
+        if timeout is None:
+            timeout = Config.FANOUT_TIMEOUT
+        
+        try:
+            query_embedding = self.vectorstore_builder.embed_queries([question])[0]
+        except Exception as e:
+            logger.error(f"✗ 问题编码失败: {e}")
+            return []
+        
+        # 线程数与collection数相同，所有collection同时开始，timeout即每个collection的时限；
+        # 超时的线程在后台跑完后自行退出
+        executor = ThreadPoolExecutor(
+            max_workers=len(collection_names),
+            thread_name_prefix="retriever-fanout"
+        )
+        futures = {
+            executor.submit(
+                self._query_collection, name, question, query_embedding,
+                top_k, score_threshold, mode, rerank, expand_window
+            ): name
+            for name in collection_names
+        }
+        done, not_done = wait(futures, timeout=timeout)
+        executor.shutdown(wait=False)
+        
+        for future in not_done:
+            logger.warning(f"collection检索超时，已跳过: {futures[future]}")
+        
+        candidates = []
+        for future in done:
+            try:
+                candidates.extend(future.result())
+            except Exception as e:
+                logger.warning(f"collection检索失败，已跳过: {futures[future]}, 错误: {e}")
+        
+        # 重排分数来自同一个模型，各collection之间可比；有结果未重排（预算耗尽）时按相似度合并
+        key = "rerank_score" if candidates and all("rerank_score" in c for c in candidates) else "score"
+        results = heapq.nlargest(top_k, candidates, key=lambda x: x[key])
+        logger.info(f"✓ 跨collection检索完成: {len(done)}/{len(futures)} 个collection返回, 找到 {len(results)} 个相关文档")
+        
+        return results
+    
+    def _query_collection(self,
+                          collection_name: str,
+                          question: str,
+                          query_embedding: List[float],
+                          top_k: int,
+                          score_threshold: float,
+                          mode: str,
+                          rerank: bool,
+                          expand_window: int) -> List[Dict[str, Any]]:
+        """用已编码的问题向量检索单个collection，结果的metadata中带collection_name"""
+        results = self._retrieve_collection(
+            collection_name, question, None, top_k, score_threshold, mode, rerank, expand_window,
+            query_embedding=query_embedding
+        )
+        for result in results:
+            result["metadata"] = dict(result["metadata"], collection_name=collection_name)
+        
+        return results
+    
+    def _dense_search(self,
+                      vectorstore,
+                      query_embeddings: List[List[float]],
+                      top_k: int,
+                      score_threshold: float,
+                      where: Dict[str, Any] = None,
+                      collection_name: str = None) -> List[List[tuple]]:
+        """
+        用已编码的问题向量查询collection
+        
+        大型collection先按章节质心路由，只在最相关的几个章节内检索（路由相同的问题
+        合并为一次查询；最相近质心的相似度低于CHAPTER_ROUTING_MIN_SCORE或章节内
+        结果不足top_k时退回全书检索）。
+        开启MMR时多取mmr_fetch_k个候选并带回向量，剔除低于阈值的候选后，
+        合并近重复文本块并按MMR选出top_k个；否则直接取top_k。
+        候选数不多于top_k时（如重排序已按RERANK_FETCH_K召回）MMR没有可选的余地，
+        直接跳过，不再多取向量。
+        
+        Returns:
+            每个问题的 [(内容, 元数据, 距离)]
+        """
+        diversify = self.mmr_fetch_k > top_k
+        include = ["documents", "metadatas", "distances"]
+        if diversify:
+            include.append("embeddings")
+        n_results = self.mmr_fetch_k if diversify else top_k
+        
+        def _query(indices: List[int], group_where: Optional[Dict[str, Any]]):
+            response = vectorstore._collection.query(
+                query_embeddings=[query_embeddings[i] for i in indices],
+                n_results=n_results,
+                where=group_where,
+                include=include
+            )
+            for row, i in enumerate(indices):
+                rows[i] = {key: response[key][row] for key in ("documents", "metadatas", "distances")}
+                if diversify:
+                    rows[i]["embeddings"] = response["embeddings"][row]
+        
+        rows: List[Optional[Dict[str, Any]]] = [None] * len(query_embeddings)
+        routes = self._route_chapters(collection_name, query_embeddings) if collection_name else None
+        if routes:
+            groups: Dict[tuple, List[int]] = {}
+            for i, chapters in enumerate(routes):
+                groups.setdefault(tuple(sorted(chapters)), []).append(i)
+            for chapters, indices in groups.items():
+                # 空路由表示与所有章节质心都不够相近，直接全书检索
+                _query(indices, self._merge_filters(where, {"chapter": {"$in": list(chapters)}}) if chapters else where)
+            
+            fallback = [i for i, row in enumerate(rows) if routes[i] and len(row["documents"]) < top_k]
+            if fallback:
+                logger.debug(f"章节内结果不足，{len(fallback)} 个问题退回全书检索")
+                _query(fallback, where)
+        else:
+            _query(list(range(len(query_embeddings))), where)
+        
+        all_hits = []
+        for query_embedding, row in zip(query_embeddings, rows):
+            hits = list(zip(row["documents"], row["metadatas"], row["distances"]))
+            if diversify and hits:
+                candidates = [j for j, hit in enumerate(hits) if 1 / (1 + hit[2]) >= score_threshold]
+                embeddings = row["embeddings"]
+                selected = maximal_marginal_relevance(
+                    query_embedding,
+                    [embeddings[j] for j in candidates],
+                    top_k,
+                    lambda_mult=self.mmr_lambda,
+                    duplicate_threshold=self.dedup_threshold
+                )
+                hits = [hits[candidates[j]] for j in selected]
+            all_hits.append(hits[:top_k])
+        
+        return all_hits
+    
+    def _route_chapters(self,
+                        collection_name: str,
+                        query_embeddings: List[List[float]]) -> Optional[List[List[str]]]:
+        """
+        章节路由：为每个问题选出质心最相近的章节
+        
+        未开启路由、没有章节索引、章节数不超过路由数或collection规模较小时返回None。
+        """
+        if self.chapter_top_n <= 0:
+            return None
+        chapter_index = self.vectorstore_builder.get_chapter_index(collection_name)
+        if (not chapter_index
+                or len(chapter_index.chapters) <= self.chapter_top_n
+                or chapter_index.total_chunks < Config.CHAPTER_ROUTING_MIN_CHUNKS):
+            return None
+        return chapter_index.route(query_embeddings, self.chapter_top_n, Config.CHAPTER_ROUTING_MIN_SCORE)
+    
+    def _merge_filters(self, *filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """用$and合并多个where条件"""
+        clauses = [f for f in filters if f]
+        if not clauses:
+            return None
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"$and": clauses}
+    
+    def _process_dense_hits(self,
+                            hits: List[tuple],
+                            version: str,
+                            score_threshold: float) -> List[Dict[str, Any]]:
+        """
+        处理向量检索结果：距离转相似度、过滤低分和版本不匹配的文档
+        
+        Args:
+            hits: [(内容, 元数据, 距离)]
+        """
+        results = []
+        for content, metadata, score in hits:
+            metadata = metadata or {}
+            
+            # 计算相似度分数（ChromaDB返回的是距离，需要转换为相似度）
+            similarity_score = 1 / (1 + score)
+            
+            # 过滤低相似度文档
+            if similarity_score < score_threshold:
+                continue
+            
+            # 二次验证版本号（如果提供了版本）
+            if version and metadata.get("version") != version:
+                logger.warning(f"版本不匹配: 期望{version}, 实际{metadata.get('version')}")
+                continue
+            
+            result = {
+                "content": content,
+                "metadata": metadata,
+                "score": similarity_score
+            }
+            results.append(result)
+        
+        # 按相似度排序
+        results.sort(key=lambda x: x["score"], reverse=True)
+        
+        return results
+    
+    def _expand_neighbors(self,
+                          collection_name: str,
+                          results: List[Dict[str, Any]],
+                          window: int) -> List[Dict[str, Any]]:
+        """
+        相邻文本块扩展：用小块命中，返回前后各window个相邻块拼接成的段落
+        
+        按chunk_seq从顺序存储中直接取相邻块，不再查询向量库。已被排名更靠前的段落
+        覆盖的命中不再单独返回；没有chunk_seq的结果（旧collection）保持不变。
+        """
+        chunk_store = self.vectorstore_builder.get_chunk_store(collection_name)
+        if not chunk_store:
+            return results
+        
+        covered = set()
+        expanded = []
+        for result in results:
+            seq = result["metadata"].get("chunk_seq")
+            if not isinstance(seq, int):
+                expanded.append(result)
+                continue
+            if seq in covered:
+                continue
+            
+            seqs = [s for s in chunk_store.window(seq, window) if s not in covered]
+            covered.update(seqs)
+            expanded.append(dict(
+                result,
+                content=join_chunks([chunk_store.get(s)["content"] for s in seqs]),
+                context_seqs=seqs
+            ))
+        
+        return expanded
+    
+    def _version_filter(self, version: str = None) -> Optional[Dict[str, Any]]:
+        """版本号对应的where条件"""
+        return {"version": version} if version else None
+    
+    def _lexical_search(self,
+                        lexical_index: LexicalIndex,
+                        question: str,
+                        version: str,
+                        top_k: int) -> List[Dict[str, Any]]:
+        """
+        BM25检索，按BM25分数降序
+        
+        结果不带score：lexical_score为相对最高分归一化后的BM25分数，与向量相似度不可比，
+        由_score_lexical_hits补上与向量检索同口径的score。
+        
+        倒排索引不支持元数据过滤，版本号只能后置过滤：命中不足top_k时
+        自适应扩大召回数量（每次翻倍），直到凑够或达到Config.RETRIEVAL_MAX_FETCH_K。
+        """
+        def _matches(doc_id: int) -> bool:
+            return not version or lexical_index.get_document(doc_id)["metadata"].get("version") == version
+        
+        hits = self._overfetch(
+            lambda k: lexical_index.search(question, k),
+            lambda hit: _matches(hit[0]),
+            top_k
+        )
+        top_score = hits[0][1] if hits else 0.0
+        
+        results = []
+        for doc_id, bm25_score in hits:
+            doc = lexical_index.get_document(doc_id)
+            results.append({
+                "content": doc["content"],
+                "metadata": doc["metadata"],
+                "lexical_score": bm25_score / top_score,
+                "bm25_score": bm25_score,
+                "doc_id": doc_id
+            })
+        
+        return results
+    
+    def _overfetch(self, search, predicate, top_k: int) -> list:
+        """
+        自适应扩大召回：用于无法下推到检索端的过滤条件
+        
+        Args:
+            search: search(k) -> 按相关度降序的候选列表
+            predicate: 候选是否满足过滤条件
+            top_k: 需要的结果数量
+            
+        Returns:
+            最多top_k个满足条件的候选
+        """
+        max_fetch_k = max(top_k, Config.RETRIEVAL_MAX_FETCH_K)
+        fetch_k = top_k
+        while True:
+            candidates = search(fetch_k)
+            matched = [candidate for candidate in candidates if predicate(candidate)]
+            # 凑够了、候选已取尽或达到上限时停止
+            if len(matched) >= top_k or len(candidates) < fetch_k or fetch_k >= max_fetch_k:
+                if len(matched) < top_k and fetch_k >= max_fetch_k:
+                    logger.debug(f"扩大召回达到上限 {max_fetch_k}，仅找到 {len(matched)} 个满足条件的文档")
+                return matched[:top_k]
+            fetch_k = min(fetch_k * 2, max_fetch_k)
+    
+    def _fuse_results(self,
+                      dense_results: List[Dict[str, Any]],
+                      lexical_results: List[Dict[str, Any]],
+                      top_k: int) -> List[Dict[str, Any]]:
+        """
+        用RRF融合向量检索和BM25检索结果
+        
+        两路结果按文本内容对齐，排序依据RRF分数（rrf_score）。score仍是向量相似度：
+        两路都命中的沿用向量检索的score并带上bm25_score；只被BM25命中的暂不带score，
+        由_score_lexical_hits补算。
+        """
+        by_content: Dict[str, Dict[str, Any]] = {}
+        for result in dense_results:
+            by_content.setdefault(result["content"], dict(result))
+        for result in lexical_results:
+            if result["content"] in by_content:
+                by_content[result["content"]]["bm25_score"] = result["bm25_score"]
+            else:
+                by_content[result["content"]] = dict(result)
+        
+        fused = reciprocal_rank_fusion([
+            [result["content"] for result in dense_results],
+            [result["content"] for result in lexical_results]
+        ])
+        
+        ranked = sorted(fused, key=fused.get, reverse=True)[:top_k]
+        results = []
+        for content in ranked:
+            result = by_content[content]
+            result["rrf_score"] = fused[content]
+            results.append(result)
+        
+        return results
+    
+    def _score_lexical_hits(self,
+                            vectorstore,
+                            collection_name: str,
+                            query_embedding: List[float],
+                            results: List[Dict[str, Any]]):
+        """
+        为只被BM25命中的结果补上向量相似度score（原地修改）
+        
+        BM25的文档号与collection中的id一一对应（{collection_name}_{文档号}），
+        按id取回向量后计算与问题向量的平方L2距离，同样换算为1/(1+距离)，
+        与向量检索的score口径一致，置信度和阈值逻辑无需区分来源。取不到向量时记为0。
+        """
+        missing = [result for result in results if "score" not in result]
+        if not missing:
+            return
+        
+        ids = [f"{collection_name}_{result['doc_id']}" for result in missing]
+        data = vectorstore._collection.get(ids=ids, include=["embeddings"])
+        vectors = dict(zip(data["ids"], data["embeddings"]))
+        
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        for doc_id, result in zip(ids, missing):
+            vector = vectors.get(doc_id)
+            if vector is None:
+                result["score"] = 0.0
+                continue
+            vector = np.asarray(vector, dtype=np.float32)
+            vector = vector / max(float(np.linalg.norm(vector)), 1e-12)
+            result["score"] = 1 / (1 + float(np.sum((query - vector) ** 2)))
+    
     def retrieve_with_filters(self,
                              collection_name: str,
                              question: str,
@@ -76,6 +76,18 @@ class VersionValidatorAgent:
         book_id = book_info["id"]
         return f"{book_id}_v{version}"
     
+    def get_latest_collection_name(self, book_name: str) -> str:
+        """获取书籍最新版本的collection名称"""
+        book_info = self._find_book(book_name)
+        if not book_info:
+            return ""
+        
+        latest_version = self._get_latest_version(book_info)
+        if not latest_version:
+            return ""
+        
+        return f"{book_info['id']}_v{latest_version['version']}"
+    
     def list_all_books_and_versions(self) -> str:
         """列出所有可用的书籍和版本"""
         if not self.books_metadata.get("books"):
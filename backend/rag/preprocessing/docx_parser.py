@@ -82,6 +82,10 @@ class DOCXParser:
                         )
                         chunks.append(table_chunk)
             
+            # 书内阅读顺序的序号，检索时据此取相邻文本块
+            for seq, chunk in enumerate(chunks):
+                chunk["metadata"]["chunk_seq"] = seq
+            
             logger.info(f"✓ DOCX解析完成: {len(chunks)} 个文本块")
             return chunks
             
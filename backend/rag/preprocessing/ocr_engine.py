@@ -0,0 +1,318 @@
+"""OCR引擎 - 按文档抽样选定语言和配置，多进程识别扫描页，并按页面图像哈希缓存结果"""
+import hashlib
+import io
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+import fitz  # PyMuPDF
+from loguru import logger
+from ..utils.config import Config
+
+# 候选语言
+OCR_LANGUAGES = ['chi_sim+eng', 'chi_sim', 'eng']
+# 候选Tesseract配置
+OCR_CONFIGS = [
+    r'--oem 3 --psm 6',  # 中英文混合，自动页面分割
+    r'--oem 3 --psm 4',  # 单列文本
+    r'--oem 3 --psm 7',  # 单行文本
+    r'--oem 3 --psm 3'   # 默认配置
+]
+# 候选策略 (语言, 配置)
+OCR_STRATEGIES: List[Tuple[str, str]] = [(lang, config) for lang in OCR_LANGUAGES for config in OCR_CONFIGS]
+# 识别结果不超过该字符数视为无效
+MIN_TEXT_LENGTH = 10
+# 每个OCR任务包含的页数
+PAGES_PER_TASK = 4
+
+def render_page(page) -> bytes:
+    """把页面渲染为PNG（2倍缩放提高OCR精度）"""
+    return page.get_pixmap(matrix=fitz.Matrix(2, 2)).tobytes("png")
+
+def image_digest(png: bytes) -> str:
+    """页面图像的sha256摘要（缓存键）"""
+    return hashlib.sha256(png).hexdigest()
+
+def _ocr_text(image, lang: str, config: str) -> str:
+    import pytesseract
+    try:
+        return pytesseract.image_to_string(image, lang=lang, config=config).strip()
+    except Exception as e:
+        logger.debug(f"OCR配置失败: lang={lang}, config={config}, error={e}")
+        return ""
+
+def _longest(texts: Sequence[str]) -> str:
+    """最长的有效文本，全部无效时返回空串"""
+    best = max(texts, key=len, default="")
+    return best if len(best) > MIN_TEXT_LENGTH else ""
+
+def _open_image(doc, page_num: int):
+    from PIL import Image
+    return Image.open(io.BytesIO(render_page(doc[page_num])))
+
+def _init_worker():
+    # 多进程并行时每个tesseract只用一个线程，避免OpenMP线程互相争抢CPU
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+def _ocr_sample(pdf_path: str, page_num: int) -> List[str]:
+    """工作进程：用全部候选策略识别一页，返回各策略的文本（渲染失败时全为空串）"""
+    try:
+        doc = fitz.open(pdf_path)
+        try:
+            image = _open_image(doc, page_num)
+        finally:
+            doc.close()
+    except Exception as e:
+        logger.warning(f"页面 {page_num + 1} 渲染失败: {e}")
+        return [""] * len(OCR_STRATEGIES)
+    return [_ocr_text(image, lang, config) for lang, config in OCR_STRATEGIES]
+
+def _run_tasks(pool: Optional[ProcessPoolExecutor], fn, tasks: List[tuple], failed) -> list:
+    """
+    执行任务（有进程池时并行），结果与tasks一一对应
+
+    单个任务出错或工作进程崩溃时，该任务的结果用failed(task)代替，不影响其余任务。
+    """
+    futures = None
+    if pool is not None:
+        try:
+            futures = [pool.submit(fn, *task) for task in tasks]
+        except Exception as e:
+            logger.warning(f"OCR进程池不可用，改为在当前进程中识别: {e}")
+    outputs = []
+    for i, task in enumerate(tasks):
+        try:
+            outputs.append(futures[i].result() if futures else fn(*task))
+        except Exception as e:
+            logger.warning(f"OCR任务失败，相关页面按无文本处理: {e}")
+            outputs.append(failed(task))
+    return outputs
+
+def _ocr_pages(pdf_path: str, page_nums: List[int], strategy: Tuple[str, str]) -> List[str]:
+    """工作进程：用选定策略识别若干页，个别页结果无效时再尝试其余策略"""
+    doc = fitz.open(pdf_path)
+    try:
+        texts = []
+        for page_num in page_nums:
+            try:
+                image = _open_image(doc, page_num)
+            except Exception as e:
+                logger.warning(f"页面 {page_num + 1} 渲染失败: {e}")
+                texts.append("")
+                continue
+            text = _ocr_text(image, *strategy)
+            if len(text) <= MIN_TEXT_LENGTH:
+                text = _longest([_ocr_text(image, lang, config)
+                                 for lang, config in OCR_STRATEGIES if (lang, config) != strategy])
+            texts.append(text)
+        return texts
+    finally:
+        doc.close()
+
+class OcrCache:
+    """
+    OCR结果缓存（SQLite）
+
+    键为渲染后页面图像的sha256，同一页面无论出现在哪个文件、第几次入库都只识别一次。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_pages ("
+            "digest TEXT PRIMARY KEY, text TEXT NOT NULL, lang TEXT, config TEXT)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, digests: Sequence[str]) -> Dict[str, str]:
+        """批量查询，返回命中的 {摘要: 文本}"""
+        found = {}
+        unique = list(dict.fromkeys(digests))
+        with self._lock:
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT digest, text FROM ocr_pages WHERE digest IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                found.update(rows)
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, entries: Sequence[Tuple[str, str, str, str]]):
+        """批量写入 (摘要, 文本, 语言, 配置)"""
+        with self._lock:
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO ocr_pages (digest, text, lang, config) VALUES (?, ?, ?, ?)",
+                    entries
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"OCR结果写入缓存失败: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM ocr_pages").fetchone()[0]
+            return {"size": size, "hits": self.hits, "misses": self.misses}
+
+# OCR结果缓存，按路径各一个
+_ocr_caches: Dict[str, OcrCache] = {}
+_ocr_caches_lock = threading.Lock()
+
+def get_ocr_cache(path: str = None) -> Optional[OcrCache]:
+    """获取OCR结果缓存，未配置路径或打开失败时返回None"""
+    path = path if path is not None else Config.OCR_CACHE_PATH
+    if not path:
+        return None
+    with _ocr_caches_lock:
+        if path not in _ocr_caches:
+            try:
+                _ocr_caches[path] = OcrCache(path)
+                logger.info(f"OCR结果缓存: {path}")
+            except Exception as e:
+                logger.warning(f"OCR结果缓存打开失败，不使用缓存: {e}")
+                return None
+        return _ocr_caches[path]
+
+class OcrEngine:
+    """
+    扫描页OCR引擎
+
+    一个文档只在抽样的几页上尝试全部 (语言, 配置) 组合，按有效文本总长度选出最佳策略，
+    其余页只用该策略识别（结果无效的个别页再退回尝试全部策略）；识别在多个进程中并行，
+    结果按页面图像哈希写入缓存，重新入库时直接复用。
+    """
+
+    def __init__(self, workers: int = None, sample_pages: int = None, cache_path: str = None):
+        workers = Config.OCR_WORKERS if workers is None else workers
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.sample_pages = Config.OCR_SAMPLE_PAGES if sample_pages is None else sample_pages
+        self.cache_path = cache_path
+
+    def ocr_pages(self, pdf_path: str, page_nums: Sequence[int]) -> Dict[int, str]:
+        """
+        识别PDF中的若干页
+
+        Args:
+            pdf_path: PDF文件路径
+            page_nums: 需要OCR的页码（从0开始）
+
+        Returns:
+            {页码: 识别出的文本}，识别失败的页为空串
+        """
+        start_time = time.time()
+        cache = get_ocr_cache(self.cache_path)
+
+        # 摘要在这里渲染计算，识别时工作进程再渲染一次：渲染比OCR快得多，
+        # 而把全部页面图像留在内存里传给工作进程占用太大
+        digests = {}
+        try:
+            doc = fitz.open(pdf_path)
+        except Exception as e:
+            logger.error(f"OCR打开PDF失败: {e}")
+            return {page_num: "" for page_num in page_nums}
+        try:
+            for page_num in page_nums:
+                try:
+                    digests[page_num] = image_digest(render_page(doc[page_num]))
+                except Exception as e:
+                    logger.warning(f"页面 {page_num + 1} 渲染失败，按无文本处理: {e}")
+        finally:
+            doc.close()
+
+        texts = cache.get_many(list(digests.values())) if cache else {}
+        cached_pages = sum(1 for digest in digests.values() if digest in texts)
+
+        # 未命中缓存的图像只识别一次（同一文档中重复的空白页、版权页等）
+        misses = []
+        pending = set(texts)
+        for page_num, digest in digests.items():
+            if digest not in pending:
+                pending.add(digest)
+                misses.append(page_num)
+
+        strategy = None
+        if misses:
+            recognized, strategy = self._recognize(pdf_path, misses)
+            entries = [(digests[page_num], recognized.get(page_num, ""), *strategy) for page_num in misses]
+            texts.update((digest, text) for digest, text, _, _ in entries)
+            if cache:
+                # 空结果可能来自tesseract的临时故障，不缓存，下次入库时重新识别
+                cache.put_many([entry for entry in entries if entry[1]])
+
+        results = {
+            page_num: texts.get(digests[page_num], "") if page_num in digests else ""
+            for page_num in page_nums
+        }
+        logger.info(
+            f"OCR完成: {len(page_nums)} 页 (缓存命中 {cached_pages}, 识别 {len(misses)})"
+            + (f", 策略 lang={strategy[0]}, config={strategy[1]}" if strategy else "")
+            + f", 耗时 {time.time() - start_time:.1f}秒"
+        )
+        return results
+
+    def _recognize(self, pdf_path: str, page_nums: List[int]) -> Tuple[Dict[int, str], Tuple[str, str]]:
+        """抽样选定策略后识别全部页，返回 ({页码: 文本}, 选定的策略)"""
+        step = max(1, len(page_nums) // max(self.sample_pages, 1))
+        samples = page_nums[::step][:max(self.sample_pages, 1)]
+
+        pool = None
+        if self.workers > 1 and len(page_nums) > 1:
+            try:
+                # PyMuPDF在fork出的子进程中不安全，使用spawn
+                pool = ProcessPoolExecutor(
+                    max_workers=min(self.workers, len(page_nums)),
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker
+                )
+            except Exception as e:
+                logger.warning(f"OCR进程池创建失败，改为在当前进程中识别: {e}")
+        try:
+            sample_texts = _run_tasks(
+                pool, _ocr_sample, [(pdf_path, page_num) for page_num in samples],
+                lambda task: [""] * len(OCR_STRATEGIES)
+            )
+
+            # 各策略在样本页上的有效文本总长度
+            scores = [
+                sum(len(texts[i]) for texts in sample_texts if len(texts[i]) > MIN_TEXT_LENGTH)
+                for i in range(len(OCR_STRATEGIES))
+            ]
+            best = max(range(len(OCR_STRATEGIES)), key=scores.__getitem__)
+            strategy = OCR_STRATEGIES[best]
+            logger.info(f"OCR策略: lang={strategy[0]}, config={strategy[1]} (抽样 {len(samples)} 页)")
+
+            results = {}
+            for page_num, texts in zip(samples, sample_texts):
+                text = texts[best]
+                results[page_num] = text if len(text) > MIN_TEXT_LENGTH else _longest(texts)
+
+            rest = [page_num for page_num in page_nums if page_num not in results]
+            groups = [rest[i:i + PAGES_PER_TASK] for i in range(0, len(rest), PAGES_PER_TASK)]
+            group_texts = _run_tasks(
+                pool, _ocr_pages, [(pdf_path, group, strategy) for group in groups],
+                lambda task: [""] * len(task[1])
+            )
+            for group, texts in zip(groups, group_texts):
+                results.update(zip(group, texts))
+        finally:
+            if pool:
+                pool.shutdown()
+
+        return results, strategy
+
+# 全局OCR引擎
+ocr_engine = OcrEngine()
@@ -1,16 +1,18 @@
 """PDF解析器"""
 import fitz  # PyMuPDF
+import multiprocessing
 import re
 import os
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Dict, Any, Optional
 from loguru import logger
 from ..utils.config import Config
+from .ocr_engine import ocr_engine
 
 # OCR相关导入
 try:
     import pytesseract
     from PIL import Image
-    import io
     OCR_AVAILABLE = True
     
     # 测试OCR是否可用
@@ -27,6 +29,19 @@ except ImportError as e:
     OCR_AVAILABLE = False
     logger.warning(f"OCR库未安装: {e}，将跳过图片PDF的文本提取")
 
+# 并行解析时每个任务至少包含的页数
+PAGES_PER_TASK = 8
+
+def _parse_page_range(pdf_path: str, start: int, end: int) -> List[Dict[str, Any]]:
+    """工作进程入口：解析 [start, end) 页，返回各页的解析结果"""
+    parser = PDFParser()
+    doc = fitz.open(pdf_path)
+    try:
+        pages = [parser._parse_page(doc[page_num], page_num) for page_num in range(start, end)]
+    finally:
+        doc.close()
+    return [page for page in pages if page]
+
 class PDFParser:
     """PDF解析器"""
     
@@ -34,12 +49,18 @@ class PDFParser:
         self.chunk_size = Config.PDF_CHUNK_SIZE
         self.chunk_overlap = Config.PDF_CHUNK_OVERLAP
     
-    def parse_pdf(self, pdf_path: str, max_pages: Optional[int] = None) -> List[Dict[str, Any]]:
+    def parse_pdf(self,
+                  pdf_path: str,
+                  max_pages: Optional[int] = None,
+                  workers: Optional[int] = None) -> List[Dict[str, Any]]:
         """
         解析PDF文件
         
         Args:
             pdf_path: PDF文件路径
+            max_pages: 最多解析的页数
+            workers: 并行解析的进程数，默认使用Config.PDF_PARSE_WORKERS；
+                     大于1时按页码区间分给多个进程，结果与顺序解析完全相同
             
         Returns:
             解析后的文本块列表
@@ -49,47 +70,37 @@ class PDFParser:
         try:
             # 打开PDF文件
             doc = fitz.open(pdf_path)
-            
-            chunks = []
-            current_chapter = ""
-            current_section = ""
-            
             total_pages = len(doc)
             if max_pages is not None:
                 total_pages = min(total_pages, max_pages)
-            for page_num in range(total_pages):
-                page = doc[page_num]
-                text = page.get_text()
-                
-                # 如果没有文本，尝试OCR
-                if not text.strip() and OCR_AVAILABLE:
-                    logger.info(f"页面 {page_num + 1} 无文本，尝试OCR识别...")
-                    text = self._extract_text_with_ocr(page)
-                
-                if not text.strip():
-                    logger.warning(f"页面 {page_num + 1} 无法提取文本，跳过")
-                    continue
-                
-                # 识别章节标题
-                chapter_info = self._extract_chapter_info(text, page_num)
-                if chapter_info:
-                    current_chapter = chapter_info["title"]
-                    current_section = chapter_info.get("section", "")
-                
-                # 清理文本
-                cleaned_text = self._clean_text(text)
-                
-                # 分块处理
-                page_chunks = self._split_text_into_chunks(
-                    cleaned_text, 
-                    page_num + 1,
-                    current_chapter,
-                    current_section
-                )
-                
-                chunks.extend(page_chunks)
             
-            doc.close()
+            workers = Config.PDF_PARSE_WORKERS if workers is None else workers
+            if workers <= 0:
+                workers = os.cpu_count() or 1
+            
+            if workers > 1 and total_pages >= 2 * PAGES_PER_TASK:
+                doc.close()
+                pages = self._parse_pages_parallel(pdf_path, total_pages, workers)
+            else:
+                pages = [self._parse_page(doc[page_num], page_num) for page_num in range(total_pages)]
+                doc.close()
+            
+            # 扫描页统一OCR：整个文档选定一次策略，多进程识别，结果按页面图像缓存
+            ocr_page_nums = [page["page_num"] for page in pages if page and page.get("needs_ocr")]
+            if ocr_page_nums:
+                logger.info(f"{len(ocr_page_nums)} 页无文本，进行OCR识别...")
+                ocr_texts = ocr_engine.ocr_pages(pdf_path, ocr_page_nums)
+                pages = [
+                    self._parse_text(ocr_texts.get(page["page_num"], ""), page["page_num"])
+                    if page and page.get("needs_ocr") else page
+                    for page in pages
+                ]
+            
+            chunks = self._assemble_chunks([page for page in pages if page])
+            
+            # 书内阅读顺序的序号，检索时据此取相邻文本块
+            for seq, chunk in enumerate(chunks):
+                chunk["metadata"]["chunk_seq"] = seq
             
             logger.info(f"✓ PDF解析完成: {len(chunks)} 个文本块")
             return chunks
@@ -98,6 +109,79 @@ class PDFParser:
             logger.error(f"✗ PDF解析失败: {e}")
             raise
     
+    def _parse_page(self, page, page_num: int) -> Optional[Dict[str, Any]]:
+        """
+        解析单页：提取文本、识别章节标题、清理并分块
+        
+        只依赖本页内容，可以在任意进程中执行；章节归属在_assemble_chunks中按页序确定。
+        无文本的页先标记needs_ocr，由parse_pdf统一交给OCR引擎。
+        
+        Returns:
+            {"page_num", "chapter_info", "contents"}，无法提取文本时返回None
+        """
+        text = page.get_text()
+        
+        # 如果没有文本，留待OCR
+        if not text.strip() and OCR_AVAILABLE:
+            return {"page_num": page_num, "needs_ocr": True}
+        
+        return self._parse_text(text, page_num)
+    
+    def _parse_text(self, text: str, page_num: int) -> Optional[Dict[str, Any]]:
+        """识别章节标题、清理并分块（章节信息稍后补上）"""
+        if not text.strip():
+            logger.warning(f"页面 {page_num + 1} 无法提取文本，跳过")
+            return None
+        
+        # 识别章节标题
+        chapter_info = self._extract_chapter_info(text, page_num)
+        
+        # 清理文本
+        cleaned_text = self._clean_text(text)
+        
+        # 分块处理（章节信息稍后补上）
+        page_chunks = self._split_text_into_chunks(cleaned_text, page_num + 1, "", "")
+        
+        return {
+            "page_num": page_num,
+            "chapter_info": chapter_info,
+            "contents": [chunk["content"] for chunk in page_chunks]
+        }
+    
+    def _assemble_chunks(self, pages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """按页序沿用最近一次识别到的章节标题，生成带章节信息的文本块"""
+        chunks = []
+        current_chapter = ""
+        current_section = ""
+        
+        for page in pages:
+            chapter_info = page["chapter_info"]
+            if chapter_info:
+                current_chapter = chapter_info["title"]
+                current_section = chapter_info.get("section", "")
+            
+            for content in page["contents"]:
+                chunks.append(self._create_chunk(
+                    content,
+                    page["page_num"] + 1,
+                    current_chapter,
+                    current_section
+                ))
+        
+        return chunks
+    
+    def _parse_pages_parallel(self, pdf_path: str, total_pages: int, workers: int) -> List[Dict[str, Any]]:
+        """把页码切成若干区间交给进程池，各进程自行打开文档，结果按页序合并"""
+        # 区间数多于进程数，OCR页集中的区间不会拖慢整体
+        task_pages = max(PAGES_PER_TASK, -(-total_pages // (workers * 4)))
+        ranges = [(start, min(start + task_pages, total_pages)) for start in range(0, total_pages, task_pages)]
+        logger.info(f"并行解析: {total_pages} 页, {len(ranges)} 个区间, {workers} 个进程")
+        
+        # PyMuPDF和tesseract在fork出的子进程中不安全，使用spawn
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            futures = [pool.submit(_parse_page_range, pdf_path, start, end) for start, end in ranges]
+            return [page for future in futures for page in future.result()]
+    
     def _extract_chapter_info(self, text: str, page_num: int) -> Optional[Dict[str, str]]:
         """提取章节信息"""
         # 章节标题模式
@@ -349,61 +433,6 @@ class PDFParser:
         
         logger.info(f"批量解析完成，共生成 {len(all_chunks)} 个collections")
         return all_chunks
-    
-    def _extract_text_with_ocr(self, page) -> str:
-        """使用OCR提取页面文本"""
-        try:
-            # 将页面转换为图片
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))  # 2倍缩放提高OCR精度
-            img_data = pix.tobytes("png")
-            
-            # 转换为PIL图像
-            image = Image.open(io.BytesIO(img_data))
-            
-            # 尝试不同的OCR配置
-            configs = [
-                # 配置1: 中英文混合，自动页面分割
-                r'--oem 3 --psm 6',
-                # 配置2: 单列文本
-                r'--oem 3 --psm 4',
-                # 配置3: 单行文本
-                r'--oem 3 --psm 7',
-                # 配置4: 默认配置
-                r'--oem 3 --psm 3'
-            ]
-            
-            # 尝试不同的语言设置
-            languages = ['chi_sim+eng', 'chi_sim', 'eng']
-            
-            best_text = ""
-            best_length = 0
-            
-            for lang in languages:
-                for config in configs:
-                    try:
-                        text = pytesseract.image_to_string(image, lang=lang, config=config)
-                        text = text.strip()
-                        
-                        # 选择最长的有效文本
-                        if len(text) > best_length and len(text) > 10:
-                            best_text = text
-                            best_length = len(text)
-                            logger.debug(f"OCR成功: lang={lang}, config={config}, 长度={len(text)}")
-                            
-                    except Exception as e:
-                        logger.debug(f"OCR配置失败: lang={lang}, config={config}, error={e}")
-                        continue
-            
-            if best_text:
-                logger.info(f"OCR提取成功，文本长度: {len(best_text)}")
-                return best_text
-            else:
-                logger.warning("所有OCR配置都失败了")
-                return ""
-            
-        except Exception as e:
-            logger.error(f"OCR处理失败: {e}")
-            return ""
 
 # 测试代码
 if __name__ == "__main__":
@@ -26,11 +26,35 @@ class Config:
     # ===== Embedding配置 =====
     EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "BAAI/bge-large-zh-v1.5")
     EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")
-    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # torch 或 onnx（ONNX Runtime，仅CPU）
+    EMBEDDING_MAX_LENGTH = int(os.getenv("EMBEDDING_MAX_LENGTH", "512"))  # ONNX后端分词最大长度
+    ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", "./models/onnx")  # 导出的ONNX模型缓存目录
+    ONNX_QUANTIZATION = os.getenv("ONNX_QUANTIZATION", "none")  # none 或 int8（动态量化）
+    ONNX_NUM_THREADS = int(os.getenv("ONNX_NUM_THREADS", "0"))  # ONNX Runtime计算线程数，0表示默认
+    EMBEDDING_SERVER_SOCKET = os.getenv("EMBEDDING_SERVER_SOCKET", "")  # 共享Embedding服务的Unix socket路径，留空则进程内加载模型
+    EMBEDDING_SERVER_MAX_BATCH = int(os.getenv("EMBEDDING_SERVER_MAX_BATCH", "64"))  # 服务端合批的最大文本数
+    EMBEDDING_SERVER_MAX_WAIT_MS = float(os.getenv("EMBEDDING_SERVER_MAX_WAIT_MS", "5"))  # 服务端凑批的最长等待（毫秒）
+    EMBEDDING_SERVER_TIMEOUT = float(os.getenv("EMBEDDING_SERVER_TIMEOUT", "60"))  # 客户端请求超时（秒）
+    EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))  # 建库时每批编码的文本块数
+    EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))  # 建库编码进程数，1表示单进程；>1时每个进程额外加载一份模型（bge-large约1.3GB），0表示自动（最多4个）
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "./database/embedding_cache")  # 文本块向量缓存目录（按文本sha256复用），留空则关闭
+    QUERY_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_BATCH_MAX_WAIT_MS", "0"))  # 查询编码凑批的最长等待（毫秒），0表示不合批；单个查询最多多等这么久
+    QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))  # 查询编码每批最多合并的问题数
+    QUERY_BATCH_TIMEOUT = float(os.getenv("QUERY_BATCH_TIMEOUT", "30"))  # 合批查询编码的等待超时（秒）
+    QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "2048"))  # 查询向量内存缓存条数，0表示关闭
+    QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "")  # 查询向量持久缓存(SQLite)路径，留空则只用内存
     
     # ===== 向量数据库配置 =====
-    VECTOR_DB = os.getenv("VECTOR_DB", "chroma")
+    VECTOR_DB = os.getenv("VECTOR_DB", "chroma")  # chroma 或 numpy（内存映射矩阵暴力检索）
     CHROMA_PATH = os.getenv("CHROMA_PATH", "./database/chroma_db")
+    VECTORSTORE_POOL_SIZE = int(os.getenv("VECTORSTORE_POOL_SIZE", "16"))  # 进程内最多同时打开的collection数（向量库、BM25、章节、顺序存储句柄合计占一个名额）
+    COLLECTION_MARKER_PATH = os.getenv("COLLECTION_MARKER_PATH", "./database/collection_markers")  # 建库时替换的标记文件目录，API进程据此发现其他进程的重建并作废句柄和缓存
+    VECTORSTORE_UPSERT_BATCH = int(os.getenv("VECTORSTORE_UPSERT_BATCH", "1000"))  # 建库时每次写入向量库的文本块数
+    FLAT_INDEX_PATH = os.getenv("FLAT_INDEX_PATH", "./database/flat_index")  # VECTOR_DB=numpy时的索引目录
+    VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")  # none/float16/int8，平铺索引常驻内存的压缩方式
+    LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", "./database/lexical_index")  # BM25倒排索引目录
+    CHAPTER_INDEX_PATH = os.getenv("CHAPTER_INDEX_PATH", "./database/chapter_index")  # 章节路由索引目录
+    CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", "./database/chunk_store")  # 文本块顺序存储目录（相邻文本块扩展）
     
     # Qdrant配置
     QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
@@ -39,17 +63,57 @@ class Config:
     # ===== 文档处理配置 =====
     PDF_CHUNK_SIZE = int(os.getenv("PDF_CHUNK_SIZE", "1000"))
     PDF_CHUNK_OVERLAP = int(os.getenv("PDF_CHUNK_OVERLAP", "200"))
+    PDF_PARSE_WORKERS = int(os.getenv("PDF_PARSE_WORKERS", "1"))  # PDF按页并行解析的进程数，1表示顺序解析，0表示按CPU核数
+    OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0"))  # 扫描页OCR的进程数，0表示按CPU核数
+    OCR_SAMPLE_PAGES = int(os.getenv("OCR_SAMPLE_PAGES", "3"))  # 每个文档抽样几页来选定OCR语言和配置
+    OCR_CACHE_PATH = os.getenv("OCR_CACHE_PATH", "./database/ocr_cache.db")  # OCR结果缓存(SQLite)，按页面图像哈希复用，留空则关闭
     DOCX_CHUNK_SIZE = int(os.getenv("DOCX_CHUNK_SIZE", "1000"))
     DOCX_CHUNK_OVERLAP = int(os.getenv("DOCX_CHUNK_OVERLAP", "200"))
     
     # ===== 检索配置 =====
     RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "5"))
     RETRIEVAL_SCORE_THRESHOLD = float(os.getenv("RETRIEVAL_SCORE_THRESHOLD", "0.5"))
+    # dense: 仅向量; hybrid: 向量+BM25融合; lexical: 仅BM25。
+    # score始终为向量相似度（仅被BM25命中的文档按其向量补算），BM25和融合分数见bm25_score/lexical_score/rrf_score
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "dense")
+    RETRIEVAL_MAX_FETCH_K = int(os.getenv("RETRIEVAL_MAX_FETCH_K", "100"))  # 后置过滤时自适应扩大召回的上限
+    RETRIEVAL_CACHE_SIZE = int(os.getenv("RETRIEVAL_CACHE_SIZE", "4096"))  # 检索结果缓存条数，0表示关闭
+    RETRIEVAL_EXPAND_WINDOW = int(os.getenv("RETRIEVAL_EXPAND_WINDOW", "0"))  # 命中文本块前后各扩展的相邻块数，0表示不扩展
+    RETRIEVAL_MMR_FETCH_K = int(os.getenv("RETRIEVAL_MMR_FETCH_K", "0"))  # MMR候选数（需大于召回数才生效），越大越多样但越慢；默认0关闭MMR和去重
+    RETRIEVAL_MMR_LAMBDA = float(os.getenv("RETRIEVAL_MMR_LAMBDA", "0.7"))  # MMR相关性权重，1.0只做近重复合并
+    RETRIEVAL_DEDUP_THRESHOLD = float(os.getenv("RETRIEVAL_DEDUP_THRESHOLD", "0.95"))  # 余弦相似度不低于该值视为近重复
+    # 先路由到最相关的N个章节再检索，默认0关闭。章节标签来自解析器（含PDF的"第N页"兜底和数字行规则），
+    # 路由错误会静默降低召回，开启前应评估召回率
+    CHAPTER_ROUTING_TOP_N = int(os.getenv("CHAPTER_ROUTING_TOP_N", "0"))
+    CHAPTER_ROUTING_MIN_SCORE = float(os.getenv("CHAPTER_ROUTING_MIN_SCORE", "0.5"))  # 最相近章节质心的余弦相似度低于该值时不路由，全书检索
+    CHAPTER_ROUTING_MIN_CHUNKS = int(os.getenv("CHAPTER_ROUTING_MIN_CHUNKS", "2000"))  # 文本块数达到该值的collection才做章节路由
+    
+    # 重排序配置（交叉编码器，CPU）
+    RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() == "true"
+    RERANK_MODEL = os.getenv("RERANK_MODEL", "BAAI/bge-reranker-base")
+    RERANK_FETCH_K = int(os.getenv("RERANK_FETCH_K", "20"))  # 送入重排序的候选数
+    RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+    RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", "300"))  # 单次查询的重排序时间预算，超出则保持检索顺序
+    RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "10000"))  # (问题, 文本块) 分数缓存条数
+    
+    # 语义答案缓存（同一collection下的近义问题复用答案，跳过检索和LLM），默认关闭
+    ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "false").lower() == "true"
+    # 问题向量余弦相似度阈值。注意误命中风险：bge-zh下"…的优点"与"…的缺点"这类只差一两个字、
+    # 意思相反的问题相似度常高于0.95，会直接返回另一个问题的答案；开启前应在真实问题上评估
+    ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+    ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))  # 条目有效期（秒），0表示不过期
+    ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1000"))  # 每个collection最多缓存的答案数
+    FANOUT_TIMEOUT = float(os.getenv("FANOUT_TIMEOUT", "2.0"))  # 单个collection检索超时（秒），超时结果丢弃
     
     # ===== API配置 =====
     API_PORT = int(os.getenv("API_PORT", "8000"))
     API_WORKERS = int(os.getenv("API_WORKERS", "4"))
     API_HOST = os.getenv("API_HOST", "0.0.0.0")
+    QUERY_MAX_WORKERS = int(os.getenv("QUERY_MAX_WORKERS", "4"))  # /query同时执行的查询数
+    QUERY_MAX_QUEUE = int(os.getenv("QUERY_MAX_QUEUE", "16"))  # 最多排队的查询数，超出返回429
+    QUERY_QUEUE_TIMEOUT = float(os.getenv("QUERY_QUEUE_TIMEOUT", "30"))  # 排队超过该秒数不再执行，返回503
+    WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "5"))  # 启动时按查询历史预热的热门书籍/版本数，0表示只加载模型
+    WARMUP_HISTORY_DAYS = int(os.getenv("WARMUP_HISTORY_DAYS", "30"))  # 统计热度时取最近多少天的查询历史
     
     # ===== 数据库配置 =====
     DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./dt_study_companion.db")
@@ -159,6 +223,11 @@ class Config:
             config.update({
                 "path": cls.CHROMA_PATH
             })
+        elif cls.VECTOR_DB == "numpy":
+            config.update({
+                "path": cls.FLAT_INDEX_PATH,
+                "quantization": cls.VECTOR_QUANTIZATION
+            })
         elif cls.VECTOR_DB == "qdrant":
             config.update({
                 "host": cls.QDRANT_HOST,
@@ -0,0 +1,106 @@
+"""章节路由索引 - 章节质心向量 + 章节到文本块的映射"""
+import json
+import os
+import shutil
+from typing import Any, Dict, List
+import numpy as np
+from loguru import logger
+from ..utils.config import Config
+
+class ChapterIndex:
+    """
+    章节路由索引
+
+    磁盘格式（一个目录）：
+        centroids.npy   float32[C, D]，各章节文本块向量的归一化均值
+        chapters.json   [{"chapter": 章节名, "ids": [文本块id]}]，与centroids逐行对应
+    查询时先用问题向量与全部质心比较选出最相关的几个章节，再只在这些章节内检索。
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.centroids = np.load(os.path.join(index_dir, "centroids.npy"))
+        with open(os.path.join(index_dir, "chapters.json"), 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        self.chapters: List[str] = [entry["chapter"] for entry in entries]
+        self.chunk_ids: Dict[str, List[str]] = {entry["chapter"]: entry["ids"] for entry in entries}
+        self.total_chunks = sum(len(ids) for ids in self.chunk_ids.values())
+
+    @classmethod
+    def build(cls,
+              index_dir: str,
+              ids: List[str],
+              embeddings,
+              metadatas: List[Dict[str, Any]]) -> "ChapterIndex":
+        """
+        按metadata中的chapter字段聚合文本块向量并写入磁盘（已存在则覆盖）
+
+        Args:
+            index_dir: 索引目录
+            ids: 文本块id
+            embeddings: 文本块向量
+            metadatas: 文本块元数据
+        """
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+        rows: Dict[str, List[int]] = {}
+        for i, metadata in enumerate(metadatas):
+            chapter = (metadata or {}).get("chapter")
+            if chapter:
+                rows.setdefault(chapter, []).append(i)
+
+        chapters = list(rows)
+        centroids = np.zeros((len(chapters), matrix.shape[1]), dtype=np.float32)
+        for c, chapter in enumerate(chapters):
+            centroid = matrix[rows[chapter]].mean(axis=0)
+            centroids[c] = centroid / max(float(np.linalg.norm(centroid)), 1e-12)
+
+        if os.path.exists(index_dir):
+            shutil.rmtree(index_dir)
+        os.makedirs(index_dir, exist_ok=True)
+
+        np.save(os.path.join(index_dir, "centroids.npy"), centroids)
+        with open(os.path.join(index_dir, "chapters.json"), 'w', encoding='utf-8') as f:
+            json.dump(
+                [{"chapter": chapter, "ids": [ids[i] for i in rows[chapter]]} for chapter in chapters],
+                f, ensure_ascii=False
+            )
+
+        logger.info(f"章节路由索引构建完成: {len(chapters)} 个章节, 目录 {index_dir}")
+        return cls(index_dir)
+
+    def route(self, query_embeddings, top_n: int, min_score: float = 0.0) -> List[List[str]]:
+        """
+        为每个问题选出质心最相近的top_n个章节
+
+        Args:
+            query_embeddings: float32[Q, D]
+            top_n: 每个问题保留的章节数
+            min_score: 最相近质心的余弦相似度低于该值时不路由（返回空列表），由调用方全书检索
+
+        Returns:
+            每个问题的章节名列表，按相似度降序
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.centroids.shape[1])
+        if not len(self.chapters):
+            return [[] for _ in range(len(queries))]
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        scores = queries @ self.centroids.T
+        n = min(top_n, len(self.chapters))
+        top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+        return [
+            [self.chapters[c] for c in row] if scores[q, row[0]] >= min_score else []
+            for q, row in enumerate(top)
+        ]
+
+    def chunk_count(self, chapters: List[str]) -> int:
+        """指定章节包含的文本块数"""
+        return sum(len(self.chunk_ids.get(chapter, [])) for chapter in chapters)
+
+def chapter_index_dir(collection_name: str) -> str:
+    """collection对应的章节路由索引目录"""
+    return os.path.join(Config.CHAPTER_INDEX_PATH, collection_name)
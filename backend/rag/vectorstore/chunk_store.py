@@ -0,0 +1,96 @@
+"""文本块顺序存储 - 按chunk_seq取相邻文本块，无需再查向量库"""
+import json
+import os
+import shutil
+from typing import Any, Dict, List, Optional
+import numpy as np
+from loguru import logger
+from ..utils.config import Config
+
+class ChunkStore:
+    """
+    文本块顺序存储
+
+    磁盘格式（一个目录）：
+        positions.npy   int32[max_seq + 1]，chunk_seq -> chunks.json中的位置，-1表示缺失
+        chunks.json     [{"content", "metadata"}]
+    positions以mmap方式加载，chunks.json首次取文本时加载。
+    """
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        self.positions = np.load(os.path.join(store_dir, "positions.npy"), mmap_mode='r')
+        self._chunks: Optional[List[Dict[str, Any]]] = None
+
+    @classmethod
+    def build(cls, store_dir: str, chunks: List[Dict[str, Any]]) -> "ChunkStore":
+        """
+        写入存储目录（已存在则覆盖）
+
+        Args:
+            store_dir: 存储目录
+            chunks: 文本块列表，metadata中带chunk_seq（没有的文本块不参与相邻查找）
+        """
+        seqs = [chunk["metadata"].get("chunk_seq") for chunk in chunks]
+        valid = [seq for seq in seqs if isinstance(seq, int) and seq >= 0]
+        positions = np.full(max(valid) + 1 if valid else 0, -1, dtype=np.int32)
+        for position, seq in enumerate(seqs):
+            if isinstance(seq, int) and seq >= 0:
+                positions[seq] = position
+
+        if os.path.exists(store_dir):
+            shutil.rmtree(store_dir)
+        os.makedirs(store_dir, exist_ok=True)
+
+        np.save(os.path.join(store_dir, "positions.npy"), positions)
+        with open(os.path.join(store_dir, "chunks.json"), 'w', encoding='utf-8') as f:
+            json.dump(
+                [{"content": chunk["content"], "metadata": chunk["metadata"]} for chunk in chunks],
+                f, ensure_ascii=False
+            )
+
+        logger.info(f"文本块顺序存储写入完成: {len(chunks)} 个文本块, 目录 {store_dir}")
+        return cls(store_dir)
+
+    def get(self, seq: int) -> Optional[Dict[str, Any]]:
+        """按chunk_seq取文本块，不存在返回None"""
+        if seq < 0 or seq >= len(self.positions):
+            return None
+        position = int(self.positions[seq])
+        if position < 0:
+            return None
+        if self._chunks is None:
+            with open(os.path.join(self.store_dir, "chunks.json"), 'r', encoding='utf-8') as f:
+                self._chunks = json.load(f)
+        return self._chunks[position]
+
+    def window(self, seq: int, size: int) -> List[int]:
+        """seq前后各size个文本块中存在的序号（含seq本身）"""
+        return [s for s in range(seq - size, seq + size + 1) if self.get(s) is not None]
+
+def chunk_store_dir(collection_name: str) -> str:
+    """collection对应的文本块顺序存储目录"""
+    return os.path.join(Config.CHUNK_STORE_PATH, collection_name)
+
+def join_chunks(texts: List[str], max_overlap: int = None) -> str:
+    """
+    拼接相邻文本块，去掉分块时保留的重叠部分
+
+    Args:
+        texts: 按顺序排列的文本块内容
+        max_overlap: 重叠部分的最大长度，默认取PDF/DOCX分块重叠配置的较大值
+    """
+    if max_overlap is None:
+        max_overlap = max(Config.PDF_CHUNK_OVERLAP, Config.DOCX_CHUNK_OVERLAP)
+    joined = ""
+    for text in texts:
+        overlap = 0
+        # 过短的重合多半是巧合，不当作重叠
+        for length in range(min(len(joined), len(text), max_overlap), 4, -1):
+            if joined.endswith(text[:length]):
+                overlap = length
+                break
+        if joined and not overlap:
+            joined += "\n\n"
+        joined += text[overlap:]
+    return joined
@@ -0,0 +1,181 @@
+"""文本块向量缓存 - 按 (模型, 文本sha256) 复用已编码的向量，重建时只编码变化的文本块"""
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+from loguru import logger
+from ..utils.config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+_DIGEST_SIZE = 32
+
+def text_digest(text: str) -> bytes:
+    """文本内容的sha256摘要（缓存键）"""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+class EmbeddingCache:
+    """
+    文本块向量缓存
+
+    每个模型一个目录，只追加不修改：
+        meta.json      {"model": 模型名, "dim": 向量维度}
+        vectors.f32    float32[N, dim] 原始字节，以内存映射方式读取
+        keys.bin       N个32字节的sha256摘要，第i个对应vectors的第i行
+    写入时先追加向量再追加摘要，进程中途退出时多出的向量行没有摘要指向，
+    下次打开时按两者较小的行数截断。
+    多个进程（并行建库）共用同一目录：打开和写入都持有目录下.lock文件的排他锁，
+    写入前先读入其他进程追加的摘要，行号始终以文件中的实际行数为准。
+    """
+
+    def __init__(self, cache_dir: str, model_name: str):
+        self.model_name = model_name
+        self.model_dir = os.path.join(cache_dir, re.sub(r"[^\w.-]", "_", model_name))
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self.dim = 0
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _path(self, filename: str) -> str:
+        return os.path.join(self.model_dir, filename)
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程排他锁"""
+        os.makedirs(self.model_dir, exist_ok=True)
+        with open(self._path(".lock"), 'a') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        if not os.path.exists(self._path("meta.json")):
+            return
+        with self._file_lock():
+            self._sync()
+        logger.info(f"向量缓存已加载: {self.model_name}, {len(self._rows)} 条")
+
+    def _sync(self):
+        """读入磁盘上新增的摘要（调用方持有文件锁）"""
+        if not self.dim:
+            if not os.path.exists(self._path("meta.json")):
+                return
+            with open(self._path("meta.json"), 'r', encoding='utf-8') as f:
+                self.dim = json.load(f)["dim"]
+
+        known = len(self._rows)
+        with open(self._path("keys.bin"), 'rb') as f:
+            f.seek(known * _DIGEST_SIZE)
+            keys = f.read()
+        rows = min(known + len(keys) // _DIGEST_SIZE, os.path.getsize(self._path("vectors.f32")) // (4 * self.dim))
+        self._truncate(rows)
+        for i in range(rows - known):
+            self._rows[keys[i * _DIGEST_SIZE:(i + 1) * _DIGEST_SIZE]] = known + i
+
+    def _truncate(self, rows: int):
+        """丢弃上次写入中断留下的不完整记录"""
+        for filename, row_bytes in (("keys.bin", _DIGEST_SIZE), ("vectors.f32", 4 * self.dim)):
+            path = self._path(filename)
+            if os.path.getsize(path) > rows * row_bytes:
+                with open(path, 'r+b') as f:
+                    f.truncate(rows * row_bytes)
+
+    def _vectors(self) -> np.memmap:
+        if self._matrix is None or len(self._matrix) != len(self._rows):
+            self._matrix = np.memmap(self._path("vectors.f32"), dtype=np.float32, mode='r',
+                                     shape=(len(self._rows), self.dim))
+        return self._matrix
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_many(self, digests: Sequence[bytes]) -> List[Optional[np.ndarray]]:
+        """批量查询，未命中的位置为None"""
+        with self._lock:
+            if not self._rows:
+                self.misses += len(digests)
+                return [None] * len(digests)
+            matrix = self._vectors()
+            results = []
+            for digest in digests:
+                row = self._rows.get(digest)
+                results.append(None if row is None else np.array(matrix[row]))
+            hit_count = sum(vector is not None for vector in results)
+            self.hits += hit_count
+            self.misses += len(digests) - hit_count
+            return results
+
+    def put_many(self, digests: Sequence[bytes], vectors: Sequence[Sequence[float]]):
+        """批量写入（已存在的摘要跳过）"""
+        if not digests:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(len(digests), -1)
+
+        with self._lock, self._file_lock():
+            self._sync()
+            if not self.dim:
+                self.dim = matrix.shape[1]
+                # meta.json最后写入，存在即表示数据文件齐全
+                open(self._path("keys.bin"), 'wb').close()
+                open(self._path("vectors.f32"), 'wb').close()
+                with open(self._path("meta.json"), 'w', encoding='utf-8') as f:
+                    json.dump({"model": self.model_name, "dim": self.dim}, f)
+            elif matrix.shape[1] != self.dim:
+                logger.warning(f"向量维度 {matrix.shape[1]} 与缓存 {self.dim} 不一致，跳过写入: {self.model_name}")
+                return
+
+            new_rows = []
+            seen = set()
+            for i, digest in enumerate(digests):
+                if digest not in self._rows and digest not in seen:
+                    seen.add(digest)
+                    new_rows.append(i)
+            if not new_rows:
+                return
+
+            with open(self._path("vectors.f32"), 'ab') as f:
+                f.write(np.ascontiguousarray(matrix[new_rows]).tobytes())
+            with open(self._path("keys.bin"), 'ab') as f:
+                f.write(b"".join(digests[i] for i in new_rows))
+
+            for i in new_rows:
+                self._rows[digests[i]] = len(self._rows)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._rows), "dim": self.dim, "hits": self.hits, "misses": self.misses}
+
+# 各模型的缓存实例
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+def get_embedding_cache(model_name: str, cache_dir: str = None) -> Optional[EmbeddingCache]:
+    """
+    获取模型对应的向量缓存（进程内每个模型一个实例）
+
+    Args:
+        model_name: 实际加载的模型名称
+        cache_dir: 缓存根目录，默认使用Config.EMBEDDING_CACHE_PATH；为空表示关闭缓存
+    """
+    cache_dir = Config.EMBEDDING_CACHE_PATH if cache_dir is None else cache_dir
+    if not cache_dir:
+        return None
+    key = os.path.join(cache_dir, model_name)
+    with _caches_lock:
+        if key not in _caches:
+            _caches[key] = EmbeddingCache(cache_dir, model_name)
+        return _caches[key]
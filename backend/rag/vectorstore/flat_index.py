@@ -0,0 +1,392 @@
+"""NumPy平铺索引 - 内存映射的向量矩阵 + 暴力点积检索"""
+import json
+import os
+import shutil
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from loguru import logger
+
+# 预先编码、用于快速生成过滤掩码的元数据字段
+MASK_FIELDS = ["chapter", "version", "page"]
+
+# 支持的向量压缩方式
+QUANTIZATIONS = ("none", "float16", "int8")
+
+# 粗排时每次解压的行数，控制临时内存
+_SCORE_BLOCK_ROWS = 8192
+
+# 过滤后剩余行数不超过该比例时，只对剩余行打分
+_SUBSET_RATIO = 0.5
+
+# 缓存的过滤掩码数量上限
+_MASK_CACHE_SIZE = 256
+
+class FlatIndex:
+    """
+    平铺向量索引
+
+    磁盘格式（一个目录）：
+        embeddings.npy      float32[N, D]，已归一化
+        docs.json           ids、内容和元数据
+        field_<name>.npy    int32[N]，元数据字段编码（page直接存页码，缺失为-1）
+        field_<name>.json   编码 -> 取值（page无此文件）
+        embeddings_q.npy    可选，int8或float16压缩矩阵
+        quant_scale.npy     int8时的逐维缩放系数
+        quant_offset.npy    int8时的逐维偏移
+    矩阵以mmap方式加载，多个worker进程共享同一份页缓存，不产生拷贝。
+    有压缩矩阵时先在压缩矩阵上粗排，再用磁盘上的全精度向量对候选精排，
+    常驻内存只有压缩矩阵（int8约为1/4，float16约为1/2）。
+
+    接口与Chroma collection的query/count/get一致，距离为平方L2（归一化向量下等于2-2cos），
+    与Chroma默认距离相同，检索分数和阈值无需调整。
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.matrix = np.load(os.path.join(index_dir, "embeddings.npy"), mmap_mode='r')
+        with open(os.path.join(index_dir, "docs.json"), 'r', encoding='utf-8') as f:
+            docs = json.load(f)
+        self.ids: List[str] = docs["ids"]
+        self.documents: List[str] = docs["documents"]
+        self.metadatas: List[Dict[str, Any]] = docs["metadatas"]
+        self._rows: Dict[str, int] = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._fields: Dict[str, Tuple[np.ndarray, Optional[List[Any]]]] = {}
+        self._masks: Dict[Tuple[str, str], np.ndarray] = {}
+        self._masks_lock = threading.Lock()
+
+        self.quantization = "none"
+        self.codes = None
+        codes_path = os.path.join(index_dir, "embeddings_q.npy")
+        if os.path.exists(codes_path):
+            self.codes = np.load(codes_path, mmap_mode='r')
+            self.quantization = "int8" if self.codes.dtype == np.int8 else "float16"
+            if self.quantization == "int8":
+                self.scale = np.load(os.path.join(index_dir, "quant_scale.npy"))
+                self.offset = np.load(os.path.join(index_dir, "quant_offset.npy"))
+
+        for field in MASK_FIELDS:
+            codes_path = os.path.join(index_dir, f"field_{field}.npy")
+            if not os.path.exists(codes_path):
+                continue
+            values = None
+            values_path = os.path.join(index_dir, f"field_{field}.json")
+            if os.path.exists(values_path):
+                with open(values_path, 'r', encoding='utf-8') as f:
+                    values = json.load(f)
+            self._fields[field] = (np.load(codes_path, mmap_mode='r'), values)
+
+    @classmethod
+    def build(cls,
+              index_dir: str,
+              ids: List[str],
+              embeddings: List[List[float]],
+              documents: List[str],
+              metadatas: List[Dict[str, Any]],
+              quantization: str = "none") -> "FlatIndex":
+        """
+        写入索引目录（已存在则覆盖）
+
+        Args:
+            index_dir: 索引目录
+            ids: 文档id
+            embeddings: 文档向量
+            documents: 文档内容
+            metadatas: 文档元数据
+            quantization: none/float16/int8，压缩时额外写入压缩矩阵
+        """
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"不支持的向量压缩方式: {quantization}")
+        if not documents:
+            raise ValueError(f"没有可写入平铺索引的文档: {index_dir}")
+
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(documents), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = matrix / np.maximum(norms, 1e-12)
+
+        if os.path.exists(index_dir):
+            shutil.rmtree(index_dir)
+        os.makedirs(index_dir, exist_ok=True)
+
+        np.save(os.path.join(index_dir, "embeddings.npy"), matrix)
+        if quantization == "float16":
+            np.save(os.path.join(index_dir, "embeddings_q.npy"), matrix.astype(np.float16))
+        elif quantization == "int8":
+            # 逐维线性量化到[-128, 127]：x ≈ (code + 128) * scale + offset
+            offset = matrix.min(axis=0)
+            scale = np.maximum(matrix.max(axis=0) - offset, 1e-12) / 255.0
+            codes = np.round((matrix - offset) / scale) - 128
+            np.save(os.path.join(index_dir, "embeddings_q.npy"), np.clip(codes, -128, 127).astype(np.int8))
+            np.save(os.path.join(index_dir, "quant_scale.npy"), scale.astype(np.float32))
+            np.save(os.path.join(index_dir, "quant_offset.npy"), offset.astype(np.float32))
+        with open(os.path.join(index_dir, "docs.json"), 'w', encoding='utf-8') as f:
+            json.dump({"ids": ids, "documents": documents, "metadatas": metadatas}, f, ensure_ascii=False)
+
+        for field in MASK_FIELDS:
+            column = [metadata.get(field) for metadata in metadatas]
+            if field == "page":
+                codes = np.array(
+                    [value if isinstance(value, int) else -1 for value in column],
+                    dtype=np.int32
+                )
+            else:
+                values = sorted({value for value in column if value is not None}, key=str)
+                lookup = {value: i for i, value in enumerate(values)}
+                codes = np.array([lookup.get(value, -1) for value in column], dtype=np.int32)
+                with open(os.path.join(index_dir, f"field_{field}.json"), 'w', encoding='utf-8') as f:
+                    json.dump(values, f, ensure_ascii=False)
+            np.save(os.path.join(index_dir, f"field_{field}.npy"), codes)
+
+        logger.info(f"平铺索引写入完成: {len(documents)} 个文档, 维度 {matrix.shape[1]}")
+        return cls(index_dir)
+
+    def count(self) -> int:
+        return len(self.ids)
+
+    def search(self,
+               query_embeddings: np.ndarray,
+               top_k: int,
+               where: Dict[str, Any] = None,
+               rescore_factor: int = 4) -> List[List[Tuple[int, float]]]:
+        """
+        向量化top-k检索
+
+        Args:
+            query_embeddings: float32[Q, D]
+            top_k: 每个问题返回数量
+            where: Chroma风格的过滤条件
+            rescore_factor: 压缩索引粗排时保留 top_k * rescore_factor 个候选做精排
+
+        Returns:
+            每个问题的 [(文档号, 余弦相似度)]，按相似度降序
+        """
+        queries = np.asarray(query_embeddings, dtype=np.float32).reshape(-1, self.matrix.shape[1])
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        # 过滤条件足够严格时只对命中的行打分（如按章节路由），否则整体打分后屏蔽
+        rows = None
+        available = self.count()
+        if where:
+            mask = self.mask(where)
+            available = int(mask.sum())
+            if available <= self.count() * _SUBSET_RATIO:
+                rows = np.flatnonzero(mask)
+
+        k = min(top_k, available)
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+
+        if self.codes is not None:
+            scores = self._coarse_scores(queries, rows)
+        elif rows is not None:
+            scores = queries @ np.asarray(self.matrix[rows]).T
+        else:
+            scores = queries @ self.matrix.T
+        if where and rows is None:
+            scores[:, ~mask] = -np.inf
+
+        if self.codes is None:
+            top, top_scores = self._top_k(scores, k)
+            if rows is not None:
+                top = rows[top]
+        else:
+            # 粗排候选用全精度向量精排（只读取候选行）
+            candidates, _ = self._top_k(scores, min(k * rescore_factor, available))
+            if rows is not None:
+                candidates = rows[candidates]
+            exact = np.einsum('qcd,qd->qc', np.asarray(self.matrix[candidates.ravel()]).reshape(
+                candidates.shape + (self.matrix.shape[1],)), queries)
+            order, top_scores = self._top_k(exact, k)
+            top = np.take_along_axis(candidates, order, axis=1)
+
+        return [
+            [(int(i), float(score)) for i, score in zip(row_ids, row_scores)]
+            for row_ids, row_scores in zip(top, top_scores)
+        ]
+
+    def _top_k(self, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """每行取分数最高的k个，返回 (列号, 分数)，按分数降序"""
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+    def _coarse_scores(self, queries: np.ndarray, rows: np.ndarray = None) -> np.ndarray:
+        """在压缩矩阵上分块计算近似内积（rows为None时对全部行）"""
+        if self.quantization == "int8":
+            weights = queries * self.scale
+            bias = queries @ (128.0 * self.scale + self.offset)
+        else:
+            weights = queries
+            bias = np.zeros(len(queries), dtype=np.float32)
+
+        n = self.count() if rows is None else len(rows)
+        scores = np.empty((len(queries), n), dtype=np.float32)
+        for start in range(0, n, _SCORE_BLOCK_ROWS):
+            if rows is None:
+                block = self.codes[start:start + _SCORE_BLOCK_ROWS]
+            else:
+                block = self.codes[rows[start:start + _SCORE_BLOCK_ROWS]]
+            block = np.asarray(block, dtype=np.float32)
+            scores[:, start:start + len(block)] = weights @ block.T
+        return scores + bias[:, None]
+
+    def memory_bytes(self) -> int:
+        """检索时常驻内存的向量矩阵大小"""
+        if self.codes is not None:
+            return int(self.codes.nbytes)
+        return int(self.matrix.nbytes)
+
+    def query(self,
+              query_embeddings: List[List[float]],
+              n_results: int = 10,
+              where: Dict[str, Any] = None,
+              include: List[str] = None) -> Dict[str, List[List[Any]]]:
+        """与chromadb Collection.query相同格式的检索结果"""
+        hits = self.search(np.asarray(query_embeddings, dtype=np.float32), n_results, where)
+        response = {
+            "ids": [[self.ids[i] for i, _ in row] for row in hits],
+            "documents": [[self.documents[i] for i, _ in row] for row in hits],
+            "metadatas": [[self.metadatas[i] for i, _ in row] for row in hits],
+            "distances": [[2.0 - 2.0 * score for _, score in row] for row in hits]
+        }
+        if include and "embeddings" in include:
+            response["embeddings"] = [np.asarray(self.matrix[[i for i, _ in row]]) for row in hits]
+        return response
+
+    def get(self, ids: List[str] = None, include: List[str] = None) -> Dict[str, Any]:
+        """按id取文档，ids为None时导出全部（与chromadb Collection.get格式一致，不存在的id跳过）"""
+        if ids is None:
+            return {
+                "ids": list(self.ids),
+                "documents": list(self.documents),
+                "metadatas": list(self.metadatas),
+                "embeddings": np.asarray(self.matrix)
+            }
+        rows = [self._rows[doc_id] for doc_id in ids if doc_id in self._rows]
+        return {
+            "ids": [self.ids[i] for i in rows],
+            "documents": [self.documents[i] for i in rows],
+            "metadatas": [self.metadatas[i] for i in rows],
+            "embeddings": np.asarray(self.matrix[rows])
+        }
+
+    def mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """把Chroma风格的where条件转换为布尔掩码（支持$and/$or及比较运算）"""
+        if "$and" in where:
+            result = np.ones(self.count(), dtype=bool)
+            for clause in where["$and"]:
+                result &= self.mask(clause)
+            return result
+        if "$or" in where:
+            result = np.zeros(self.count(), dtype=bool)
+            for clause in where["$or"]:
+                result |= self.mask(clause)
+            return result
+
+        result = np.ones(self.count(), dtype=bool)
+        for field, condition in where.items():
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for op, value in condition.items():
+                result &= self._field_mask(field, op, value)
+        return result
+
+    def _field_mask(self, field: str, op: str, value: Any) -> np.ndarray:
+        key = (field, f"{op}:{json.dumps(value, ensure_ascii=False, sort_keys=True)}")
+        with self._masks_lock:
+            cached = self._masks.get(key)
+        if cached is not None:
+            return cached
+
+        if field in self._fields:
+            codes, values = self._fields[field]
+            if values is not None:
+                # 分类字段：比较编码
+                lookup = {v: i for i, v in enumerate(values)}
+                if op == "$eq":
+                    mask = codes == lookup.get(value, -2)
+                elif op == "$ne":
+                    mask = codes != lookup.get(value, -2)
+                elif op == "$in":
+                    mask = np.isin(codes, [lookup[v] for v in value if v in lookup])
+                elif op == "$nin":
+                    mask = ~np.isin(codes, [lookup[v] for v in value if v in lookup])
+                else:
+                    mask = self._python_mask(field, op, value)
+            else:
+                mask = self._compare(np.asarray(codes), op, value) & (codes >= 0)
+        else:
+            mask = self._python_mask(field, op, value)
+
+        # 并发查询共用掩码缓存；掩码在锁外计算，同一条件偶尔重复计算一次无妨
+        with self._masks_lock:
+            if key not in self._masks and len(self._masks) >= _MASK_CACHE_SIZE:
+                self._masks.pop(next(iter(self._masks)))
+            self._masks[key] = mask
+        return mask
+
+    def _compare(self, column: np.ndarray, op: str, value: Any) -> np.ndarray:
+        if op == "$eq":
+            return column == value
+        if op == "$ne":
+            return column != value
+        if op == "$gt":
+            return column > value
+        if op == "$gte":
+            return column >= value
+        if op == "$lt":
+            return column < value
+        if op == "$lte":
+            return column <= value
+        if op == "$in":
+            return np.isin(column, value)
+        if op == "$nin":
+            return ~np.isin(column, value)
+        raise ValueError(f"不支持的过滤运算符: {op}")
+
+    def _python_mask(self, field: str, op: str, value: Any) -> np.ndarray:
+        """没有预编码的字段逐条比较"""
+        column = [metadata.get(field) for metadata in self.metadatas]
+        if op in ("$eq", "$ne", "$in", "$nin"):
+            if op == "$eq":
+                hits = [v == value for v in column]
+            elif op == "$ne":
+                hits = [v != value for v in column]
+            elif op == "$in":
+                hits = [v in value for v in column]
+            else:
+                hits = [v not in value for v in column]
+            return np.array(hits, dtype=bool)
+        return np.array(
+            [v is not None and bool(self._compare(np.array([v]), op, value)[0]) for v in column],
+            dtype=bool
+        )
+
+class FlatVectorStore:
+    """
+    平铺索引的向量库包装
+
+    提供RetrieverAgent用到的Chroma包装接口：similarity_search(_with_score)和_collection。
+    """
+
+    def __init__(self, index: FlatIndex, embedding_function):
+        self._collection = index
+        self.embedding_function = embedding_function
+
+    def similarity_search_with_score(self,
+                                     query: str,
+                                     k: int = 4,
+                                     filter: Dict[str, Any] = None) -> List[Tuple[Document, float]]:
+        query_embedding = self.embedding_function.embed_query(query)
+        response = self._collection.query([query_embedding], n_results=k, where=filter)
+        return [
+            (Document(page_content=content, metadata=metadata), distance)
+            for content, metadata, distance in zip(
+                response["documents"][0], response["metadatas"][0], response["distances"][0]
+            )
+        ]
+
+    def similarity_search(self, query: str, k: int = 4, filter: Dict[str, Any] = None) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
@@ -0,0 +1,173 @@
+"""ONNX Runtime Embedding后端 - 首次使用时导出ONNX计算图并缓存到磁盘，CPU推理"""
+import json
+import os
+import re
+import shutil
+from typing import List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+from ..utils.config import Config
+from .length_buckets import encode_bucketed
+
+def onnx_model_dir(model_name: str, quantize: bool = False) -> str:
+    """模型对应的ONNX目录（计算图 + 分词器 + 池化方式）"""
+    return os.path.join(
+        Config.ONNX_MODEL_PATH,
+        re.sub(r"[^\w.-]", "_", model_name),
+        "int8" if quantize else "fp32"
+    )
+
+def _pooling_mode(model_name: str) -> str:
+    """读取sentence-transformers的池化配置，取不到时bge系列用CLS，其他用均值"""
+    try:
+        from huggingface_hub import hf_hub_download
+        with open(hf_hub_download(model_name, "1_Pooling/config.json"), 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        if config.get("pooling_mode_cls_token"):
+            return "cls"
+        if config.get("pooling_mode_mean_tokens"):
+            return "mean"
+    except Exception as e:
+        logger.debug(f"读取池化配置失败 {model_name}: {e}")
+    return "cls" if "bge" in model_name.lower() else "mean"
+
+def _publish(tmp_dir: str, target_dir: str):
+    """临时目录整体改名为目标目录；其他进程已先完成导出时丢弃本次结果"""
+    try:
+        os.replace(tmp_dir, target_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def export_onnx_model(model_name: str, quantize: bool = False) -> str:
+    """
+    导出ONNX模型（已存在则直接返回目录）
+
+    fp32计算图用torch.onnx.export从transformers模型导出，输出last_hidden_state，
+    池化和归一化在推理端完成；int8版本在fp32计算图上做动态量化（权重int8）。
+
+    Args:
+        model_name: HuggingFace模型名称
+        quantize: 是否导出int8动态量化版本
+
+    Returns:
+        ONNX模型目录
+    """
+    target_dir = onnx_model_dir(model_name, quantize)
+    if os.path.exists(os.path.join(target_dir, "model.onnx")):
+        return target_dir
+
+    fp32_dir = onnx_model_dir(model_name, False)
+    if not os.path.exists(os.path.join(fp32_dir, "model.onnx")):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        logger.info(f"导出ONNX模型: {model_name} -> {fp32_dir}")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name)
+        model.eval()
+
+        sample = tokenizer(["模型导出样例文本"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        tmp_dir = f"{fp32_dir}.tmp{os.getpid()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                tuple(sample[name] for name in input_names),
+                os.path.join(tmp_dir, "model.onnx"),
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+        tokenizer.save_pretrained(tmp_dir)
+        with open(os.path.join(tmp_dir, "pooling.json"), 'w', encoding='utf-8') as f:
+            json.dump({"model": model_name, "mode": _pooling_mode(model_name)}, f)
+        os.makedirs(os.path.dirname(fp32_dir), exist_ok=True)
+        _publish(tmp_dir, fp32_dir)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        logger.info(f"int8动态量化: {model_name} -> {target_dir}")
+        tmp_dir = f"{target_dir}.tmp{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        shutil.copytree(fp32_dir, tmp_dir, ignore=shutil.ignore_patterns("model.onnx*"))
+        quantize_dynamic(
+            os.path.join(fp32_dir, "model.onnx"),
+            os.path.join(tmp_dir, "model.onnx"),
+            weight_type=QuantType.QInt8
+        )
+        _publish(tmp_dir, target_dir)
+
+    return target_dir
+
+class OnnxEmbeddings(Embeddings):
+    """
+    基于ONNX Runtime的句向量模型（仅CPU）
+
+    分词后按批推理，按导出时记录的池化方式（CLS或均值）取句向量并做L2归一化，
+    与HuggingFaceEmbeddings(normalize_embeddings=True)的输出保持一致。
+    """
+
+    backend = "onnx"
+
+    def __init__(self,
+                 model_name: str,
+                 quantize: bool = False,
+                 max_length: int = None,
+                 batch_size: int = None,
+                 num_threads: int = None):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.quantize = quantize
+        self.max_length = max_length or Config.EMBEDDING_MAX_LENGTH
+        self.batch_size = batch_size or Config.EMBEDDING_BATCH_SIZE
+
+        model_dir = export_onnx_model(model_name, quantize)
+        model_path = os.path.join(model_dir, "model.onnx")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        with open(os.path.join(model_dir, "pooling.json"), 'r', encoding='utf-8') as f:
+            self.pooling = json.load(f)["mode"]
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        num_threads = Config.ONNX_NUM_THREADS if num_threads is None else num_threads
+        if num_threads > 0:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [item.name for item in self.session.get_inputs()]
+        self.model_bytes = os.path.getsize(model_path)
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np"
+        )
+        hidden = self.session.run(
+            None,
+            {name: inputs[name].astype(np.int64) for name in self.input_names}
+        )[0]
+
+        if self.pooling == "cls":
+            vectors = hidden[:, 0]
+        else:
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            vectors = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # 按长度分桶后每批各自动态补齐
+        return [vector.tolist() for vector in encode_bucketed(self._encode, texts, self.batch_size)]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._encode([text])[0].tolist()
@@ -0,0 +1,154 @@
+"""交叉编码器重排序 - 批量打分，带时间预算和分数缓存"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+from ..utils.config import Config
+from .query_cache import normalize_query
+
+def chunk_id(result: Dict[str, Any]) -> str:
+    """文本块标识：内容哈希（同一文本重建索引后仍然不变）"""
+    return hashlib.sha1(result["content"].encode("utf-8")).hexdigest()
+
+class CrossEncoderReranker:
+    """
+    交叉编码器重排序（如bge-reranker）
+
+    模型首次使用时在CPU上加载。候选中未缓存的 (问题, 文本块) 按批打分，
+    每批之前检查剩余预算，预计超时就放弃重排、保持原有顺序；
+    已算出的分数按 (问题哈希, 文本块标识) 缓存，同一问题再次检索时直接复用。
+    """
+
+    def __init__(self,
+                 model_name: str = None,
+                 batch_size: int = None,
+                 cache_size: int = None):
+        self.model_name = model_name or Config.RERANK_MODEL
+        self.batch_size = batch_size or Config.RERANK_BATCH_SIZE
+        self.cache_size = cache_size if cache_size is not None else Config.RERANK_CACHE_SIZE
+        self._model = None
+        self._load_failed = False
+        self._load_lock = threading.Lock()
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.reranked = 0
+        self.fallbacks = 0
+        self.cache_hits = 0
+        self.pairs_scored = 0
+
+    def _get_model(self):
+        """懒加载模型，加载失败后不再重试"""
+        with self._load_lock:
+            if self._model is None and not self._load_failed:
+                try:
+                    from sentence_transformers import CrossEncoder
+                    start_time = time.perf_counter()
+                    self._model = CrossEncoder(self.model_name, device="cpu", max_length=512)
+                    logger.info(f"重排序模型加载完成: {self.model_name}, 耗时 {time.perf_counter() - start_time:.1f}s")
+                except Exception as e:
+                    self._load_failed = True
+                    logger.warning(f"重排序模型加载失败，保持检索顺序: {e}")
+            return self._model
+
+    def rerank(self,
+               question: str,
+               results: List[Dict[str, Any]],
+               top_k: int,
+               budget_ms: float = None) -> List[Dict[str, Any]]:
+        """
+        重排序检索结果
+
+        Args:
+            question: 查询问题
+            results: 检索结果（按检索顺序）
+            top_k: 返回数量
+            budget_ms: 时间预算（毫秒），默认Config.RERANK_BUDGET_MS
+
+        Returns:
+            按重排分数降序的前top_k个结果（带rerank_score）；
+            模型不可用或预算耗尽时返回原顺序的前top_k个
+        """
+        if len(results) <= 1:
+            return results[:top_k]
+        model = self._get_model()
+        if model is None:
+            return results[:top_k]
+        if budget_ms is None:
+            budget_ms = Config.RERANK_BUDGET_MS
+
+        question_hash = hashlib.sha1(normalize_query(question).encode("utf-8")).hexdigest()
+        keys = [(question_hash, chunk_id(result)) for result in results]
+        scores: List[Optional[float]] = [self._cache_get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        self._count(cache_hits=len(results) - len(missing))
+
+        deadline = time.perf_counter() + budget_ms / 1000
+        batch_time = 0.0
+        for start in range(0, len(missing), self.batch_size):
+            # 按上一批的耗时预估，来不及算完下一批就放弃
+            if time.perf_counter() + batch_time > deadline:
+                self._count(fallbacks=1)
+                logger.debug(f"重排序超出预算 {budget_ms:.0f}ms，保持检索顺序")
+                return results[:top_k]
+
+            batch = missing[start:start + self.batch_size]
+            batch_start = time.perf_counter()
+            batch_scores = model.predict(
+                [(question, results[i]["content"]) for i in batch],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            batch_time = time.perf_counter() - batch_start
+            self._count(pairs_scored=len(batch))
+
+            for i, score in zip(batch, batch_scores):
+                scores[i] = float(score)
+                self._cache_put(keys[i], scores[i])
+
+        self._count(reranked=1)
+        order = sorted(range(len(results)), key=lambda i: scores[i], reverse=True)[:top_k]
+        # 复制后再加分数：调用方的结果可能同时存放在检索结果缓存中
+        return [dict(results[i], rerank_score=scores[i]) for i in order]
+
+    def _count(self, **increments: int):
+        """更新统计计数（多个请求线程并发调用）"""
+        with self._stats_lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def _cache_get(self, key: Tuple[str, str]) -> Optional[float]:
+        with self._cache_lock:
+            score = self._cache.get(key)
+            if score is not None:
+                self._cache.move_to_end(key)
+            return score
+
+    def _cache_put(self, key: Tuple[str, str], score: float):
+        if self.cache_size <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = score
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """重排序统计"""
+        with self._cache_lock:
+            cache_size = len(self._cache)
+        with self._stats_lock:
+            return {
+                "model": self.model_name,
+                "loaded": self._model is not None,
+                "reranked": self.reranked,
+                "fallbacks": self.fallbacks,
+                "pairs_scored": self.pairs_scored,
+                "cache_hits": self.cache_hits,
+                "cache_size": cache_size
+            }
+
+# 全局重排序实例
+reranker = CrossEncoderReranker()
@@ -0,0 +1,84 @@
+"""检索结果缓存 - 按collection代数失效"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+from ..utils.config import Config
+from .handle_pool import collection_pool
+from .query_cache import normalize_query
+
+class RetrievalResultCache:
+    """
+    检索结果缓存
+
+    键为 (collection, 归一化问题, 其余检索参数)，值带写入时该collection的代数。
+    collection重建、删除或增量写入都会经collection_pool.invalidate()递增代数，
+    旧代数的条目读取时直接作废，无需全局清空。代数包含磁盘标记，
+    在其他进程（建库脚本）中重建的collection同样会使本进程的条目作废。
+    """
+
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size if max_size is not None else Config.RETRIEVAL_CACHE_SIZE
+        self._entries: "OrderedDict[Tuple[str, str, Hashable], Tuple[Hashable, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def key(self, collection_name: str, question: str, *params: Hashable) -> Tuple[str, str, Hashable]:
+        """构造缓存键，params为影响检索结果的其余参数（版本、top_k、阈值等）"""
+        return (collection_name, normalize_query(question), params)
+
+    def generation(self, collection_name: str) -> Hashable:
+        """检索开始前记录代数，写入时传给put"""
+        return collection_pool.generation(collection_name)
+
+    def get(self, key: Tuple[str, str, Hashable]) -> Optional[Any]:
+        """查询缓存，未命中或已过期返回None"""
+        if self.max_size <= 0:
+            return None
+        generation = collection_pool.generation(key[0])
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != generation:
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Tuple[str, str, Hashable], results: Any, generation: Hashable):
+        """写入缓存；检索期间collection已变化（代数不一致）则丢弃"""
+        if self.max_size <= 0 or generation != collection_pool.generation(key[0]):
+            return
+
+        with self._lock:
+            self._entries[key] = (generation, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "hit_rate": self.hits / total if total else 0.0
+            }
+
+# 全局检索结果缓存
+retrieval_cache = RetrievalResultCache()
@@ -0,0 +1,181 @@
+"""语义答案缓存 - 同一collection下的近义问题直接复用已生成的答案"""
+import threading
+import time
+from typing import Any, Dict, List, Optional
+import numpy as np
+from loguru import logger
+from ..utils.config import Config
+from ..vectorstore.handle_pool import collection_pool
+
+class SemanticAnswerCache:
+    """
+    语义答案缓存
+
+    按collection分组保存 (问题向量, 答案)。查询时把问题向量与该组全部缓存向量
+    一次矩阵乘法比较，余弦相似度不低于阈值即命中，跳过检索和LLM调用。
+    条目过期（TTL）或collection重建（句柄池代数变化，包括建库脚本在其他进程中的重建）后不再命中。
+    """
+
+    def __init__(self,
+                 threshold: float = None,
+                 ttl: float = None,
+                 max_entries: int = None):
+        self.threshold = threshold if threshold is not None else Config.ANSWER_CACHE_THRESHOLD
+        self.ttl = ttl if ttl is not None else Config.ANSWER_CACHE_TTL
+        self.max_entries = max_entries if max_entries is not None else Config.ANSWER_CACHE_MAX_ENTRIES
+        # collection键 -> {"generations", "vectors": float32[N, D], "entries": [...]}
+        self._groups: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def generations(self, collection_names: List[str]) -> tuple:
+        """各collection当前的代数，检索开始前记录，写入缓存时用于判断期间是否重建"""
+        return tuple(collection_pool.generation(name) for name in sorted(collection_names))
+
+    def lookup(self, collection_names: List[str], question_embedding: List[float]) -> Optional[Dict[str, Any]]:
+        """
+        查找近义问题的缓存答案
+
+        Args:
+            collection_names: 检索的collection（跨书检索时为多个）
+            question_embedding: 问题向量
+
+        Returns:
+            {"answer", "sources", "confidence", "question", "similarity"}，未命中返回None
+        """
+        key = "+".join(sorted(collection_names))
+        query = self._normalize(question_embedding)
+        # 代数包含标记文件的stat，在锁外取得，避免并发查询排队等文件系统
+        current = self.generations(collection_names)
+
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None or group["generations"] != current:
+                # collection已重建，整组作废
+                self._groups.pop(key, None)
+                self.misses += 1
+                return None
+
+            self._expire(group)
+            if not group["entries"]:
+                self.misses += 1
+                return None
+
+            similarities = group["vectors"] @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry = group["entries"][best]
+            entry["hits"] += 1
+            entry["last_hit_at"] = time.time()
+            self.hits += 1
+
+            return {
+                "answer": entry["answer"],
+                "sources": entry["sources"],
+                "confidence": entry["confidence"],
+                "question": entry["question"],
+                "similarity": float(similarities[best])
+            }
+
+    def put(self,
+            collection_names: List[str],
+            question_embedding: List[float],
+            question: str,
+            answer: str,
+            sources: list,
+            confidence: float,
+            generations: tuple = None):
+        """
+        写入缓存
+
+        Args:
+            generations: 检索开始时各collection的代数；检索期间collection被重建则不写入
+        """
+        if self.max_entries <= 0:
+            return
+        key = "+".join(sorted(collection_names))
+        current = self.generations(collection_names)
+        if generations is not None and generations != current:
+            logger.debug(f"检索期间collection已重建，不缓存答案: {key}")
+            return
+
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None or group["generations"] != current:
+                group = {"generations": current, "vectors": None, "entries": []}
+                self._groups[key] = group
+
+            now = time.time()
+            vector = self._normalize(question_embedding)[None, :]
+            group["vectors"] = vector if group["vectors"] is None else np.vstack([group["vectors"], vector])
+            group["entries"].append({
+                "question": question,
+                "answer": answer,
+                "sources": sources,
+                "confidence": confidence,
+                "created_at": now,
+                "last_hit_at": None,
+                "hits": 0
+            })
+
+            # 超出容量时淘汰最早写入的条目
+            overflow = len(group["entries"]) - self.max_entries
+            if overflow > 0:
+                group["entries"] = group["entries"][overflow:]
+                group["vectors"] = group["vectors"][overflow:]
+
+    def invalidate(self, collection_name: str):
+        """删除包含指定collection的全部缓存"""
+        with self._lock:
+            for key in [key for key in self._groups if collection_name in key.split("+")]:
+                del self._groups[key]
+
+    def clear(self):
+        with self._lock:
+            self._groups.clear()
+
+    def stats(self, top_n: int = 20) -> Dict[str, Any]:
+        """命中统计，entries为命中次数最多的条目"""
+        with self._lock:
+            entries = [
+                {
+                    "collection": key,
+                    "question": entry["question"],
+                    "hits": entry["hits"],
+                    "age": time.time() - entry["created_at"],
+                    "last_hit_at": entry["last_hit_at"]
+                }
+                for key, group in self._groups.items()
+                for entry in group["entries"]
+            ]
+            total = self.hits + self.misses
+            return {
+                "size": len(entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "threshold": self.threshold,
+                "ttl": self.ttl,
+                "entries": sorted(entries, key=lambda x: x["hits"], reverse=True)[:top_n]
+            }
+
+    def _expire(self, group: Dict[str, Any]):
+        """删除过期条目（调用方持有锁）"""
+        if self.ttl <= 0:
+            return
+        deadline = time.time() - self.ttl
+        keep = [i for i, entry in enumerate(group["entries"]) if entry["created_at"] >= deadline]
+        if len(keep) < len(group["entries"]):
+            group["entries"] = [group["entries"][i] for i in keep]
+            group["vectors"] = group["vectors"][keep] if keep else None
+
+    def _normalize(self, vector: List[float]) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+# 全局语义答案缓存
+answer_cache = SemanticAnswerCache()
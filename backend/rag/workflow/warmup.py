@@ -0,0 +1,201 @@
+"""启动预热 - 预先打开热门collection、加载Embedding模型并预读索引文件"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+from ..utils.config import Config
+
+# 预读索引文件时每次读取的字节数
+_READ_BLOCK = 1 << 20
+
+def touch_files(path: str) -> int:
+    """
+    顺序读取目录下的全部文件，把内存映射的索引载入页缓存
+
+    Returns:
+        读取的字节数
+    """
+    total = 0
+    if not os.path.isdir(path):
+        return total
+    for root, _, files in os.walk(path):
+        for filename in files:
+            try:
+                with open(os.path.join(root, filename), 'rb') as f:
+                    while True:
+                        block = f.read(_READ_BLOCK)
+                        if not block:
+                            break
+                        total += len(block)
+            except OSError as e:
+                logger.warning(f"预读文件失败 {filename}: {e}")
+    return total
+
+def chroma_segment_dirs(persist_dir: str, collection_id: str) -> List[str]:
+    """
+    Chroma持久化目录中属于该collection的段目录（HNSW向量索引文件所在处）
+
+    文本和元数据在所有collection共用的chroma.sqlite3中，不在返回之列。
+    """
+    db_path = os.path.join(persist_dir, "chroma.sqlite3")
+    if not os.path.exists(db_path):
+        return []
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute("SELECT id FROM segments WHERE collection = ?", (str(collection_id),)).fetchall()
+    finally:
+        conn.close()
+    return [os.path.join(persist_dir, row[0]) for row in rows if os.path.isdir(os.path.join(persist_dir, row[0]))]
+
+class CollectionWarmer:
+    """
+    Collection预热器
+
+    按热度依次处理 (book_name, version)：解析出collection后经句柄池打开向量库、
+    BM25索引、章节路由索引和文本块存储，做一次空检索让模型和索引完成加载，
+    再预读磁盘上的索引文件。进度通过progress()对外暴露，供就绪检查使用。
+    """
+
+    def __init__(self, retriever, version_validator):
+        self.retriever = retriever
+        self.version_validator = version_validator
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.status = "idle"  # idle / running / ready
+        self.targets: List[str] = []
+        self.warmed: List[str] = []
+        self.failed: List[str] = []
+        self.current = ""
+        self.bytes_read = 0
+        self.started_at = 0.0
+        self.finished_at = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def resolve(self, books: List[Tuple[str, str]]) -> List[str]:
+        """把 (书名, 版本) 转成collection名称，去重并保持热度顺序；版本为空时取最新版"""
+        names = []
+        for book_name, version in books:
+            if not book_name:
+                continue
+            if version:
+                name = self.version_validator.get_collection_name(book_name, version)
+            else:
+                name = self.version_validator.get_latest_collection_name(book_name)
+            if name and name not in names:
+                names.append(name)
+        return names
+
+    def start(self, books: List[Tuple[str, str]]) -> bool:
+        """
+        在后台线程中预热
+
+        Args:
+            books: 按热度降序的 (书名, 版本) 列表
+
+        Returns:
+            是否启动了新的预热（已在运行时返回False）
+        """
+        with self._lock:
+            if self.status == "running":
+                return False
+            self.status = "running"
+            self.targets = self.resolve(books)
+            self.warmed = []
+            self.failed = []
+            self.bytes_read = 0
+            self.started_at = time.time()
+            self.finished_at = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="collection-warmup", daemon=True)
+        self._thread.start()
+        return True
+
+    def _run(self):
+        """预热入口：先加载Embedding模型，再逐个预热collection"""
+        logger.info(f"开始预热: {len(self.targets)} 个collection {self.targets}")
+        try:
+            with self._lock:
+                self.current = "embedding"
+            # 空编码，触发Embedding模型加载
+            self.retriever.vectorstore_builder.embed_queries(["预热"])
+        except Exception as e:
+            logger.warning(f"Embedding模型预热失败: {e}")
+
+        for name in self.targets:
+            with self._lock:
+                self.current = name
+            try:
+                bytes_read = self.warm_collection(name)
+                with self._lock:
+                    self.warmed.append(name)
+                    self.bytes_read += bytes_read
+            except Exception as e:
+                logger.warning(f"预热collection失败 {name}: {e}")
+                with self._lock:
+                    self.failed.append(name)
+
+        with self._lock:
+            self.current = ""
+            self.status = "ready"
+            self.finished_at = time.time()
+        logger.info(
+            f"✓ 预热完成: {len(self.warmed)}/{len(self.targets)} 个collection, "
+            f"耗时 {self.finished_at - self.started_at:.1f}s"
+        )
+
+    def warm_collection(self, collection_name: str) -> int:
+        """
+        预热单个collection
+
+        预读BM25、章节、文本块存储目录和向量索引：numpy后端读平铺索引目录，
+        Chroma后端读该collection的HNSW段目录（共用的chroma.sqlite3不预读）。
+
+        Returns:
+            预读的索引文件字节数
+        """
+        builder = self.retriever.vectorstore_builder
+        vectorstore = builder.get_vectorstore(collection_name)
+        if not vectorstore:
+            raise ValueError(f"Collection不存在: {collection_name}")
+        builder.get_lexical_index(collection_name)
+        builder.get_chapter_index(collection_name)
+        builder.get_chunk_store(collection_name)
+
+        # 空检索：Chroma首次查询时才载入HNSW索引
+        embedding = builder.embed_queries(["预热"])[0]
+        vectorstore._collection.query(query_embeddings=[embedding], n_results=1)
+
+        bytes_read = 0
+        for root in (Config.LEXICAL_INDEX_PATH, Config.CHAPTER_INDEX_PATH, Config.CHUNK_STORE_PATH):
+            bytes_read += touch_files(os.path.join(root, collection_name))
+        if builder.db_type == "numpy":
+            bytes_read += touch_files(os.path.join(builder.persist_dir, collection_name))
+        else:
+            try:
+                for segment_dir in chroma_segment_dirs(builder.persist_dir, vectorstore._collection.id):
+                    bytes_read += touch_files(segment_dir)
+            except Exception as e:
+                logger.warning(f"预读Chroma索引失败 {collection_name}: {e}")
+
+        logger.info(f"✓ 已预热collection: {collection_name} (预读 {bytes_read / 1024 / 1024:.1f} MB)")
+        return bytes_read
+
+    def progress(self) -> Dict[str, Any]:
+        """预热进度"""
+        with self._lock:
+            end = self.finished_at or time.time()
+            return {
+                "status": self.status,
+                "ready": self.status == "ready",
+                "total": len(self.targets),
+                "warmed": list(self.warmed),
+                "failed": list(self.failed),
+                "current": self.current,
+                "bytes_read": self.bytes_read,
+                "elapsed_seconds": end - self.started_at if self.started_at else 0.0
+            }
@@ -15,6 +15,10 @@ project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
 from src.preprocessing.docx_parser import DOCXParser
+from src.vectorstore.embedding_cache import get_embedding_cache, text_digest
+from src.vectorstore.handle_pool import collection_pool
+
+EMBEDDING_MODEL = 'paraphrase-multilingual-MiniLM-L12-v2'
 
 def setup_logging():
     """设置日志"""
@@ -50,8 +54,10 @@ def main():
     logger.info("🤖 加载Embedding模型...")
     try:
         # 使用轻量级中文模型
-        model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+        model = SentenceTransformer(EMBEDDING_MODEL)
         logger.info("✓ Embedding模型加载成功")
+        # 内容未变的文本块直接复用上次的向量
+        cache = get_embedding_cache(EMBEDDING_MODEL)
     except Exception as e:
         logger.error(f"❌ Embedding模型加载失败: {e}")
         return
@@ -128,8 +134,17 @@ def main():
                 batch_metas = metadatas[start_idx:end_idx]
                 batch_ids = ids[start_idx:end_idx]
                 
-                # 生成embeddings
-                embeddings = model.encode(batch_docs).tolist()
+                # 生成embeddings（只编码缓存未命中的文本块）
+                digests = [text_digest(doc) for doc in batch_docs]
+                cached = cache.get_many(digests) if cache else [None] * len(batch_docs)
+                missing = [k for k, vector in enumerate(cached) if vector is None]
+                embeddings = [None if vector is None else vector.tolist() for vector in cached]
+                if missing:
+                    encoded = model.encode([batch_docs[k] for k in missing]).tolist()
+                    for k, vector in zip(missing, encoded):
+                        embeddings[k] = vector
+                    if cache:
+                        cache.put_many([digests[k] for k in missing], encoded)
                 
                 # 添加到collection
                 collection.add(
@@ -139,7 +154,10 @@ def main():
                     ids=batch_ids
                 )
                 
-                logger.info(f"  ✓ 已处理 {end_idx}/{len(documents)} 个文本块")
+                logger.info(f"  ✓ 已处理 {end_idx}/{len(documents)} 个文本块 (新编码 {len(missing)})")
+            
+            # 通知运行中的API服务：该collection的句柄和检索缓存已过期
+            collection_pool.invalidate(collection_name)
             
             logger.info(f"  ✅ {docx_file.name} 处理完成")
             
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""对比按原顺序切批与按长度分桶切批的编码吞吐量和填充效率"""
+import sys
+import time
+import argparse
+from pathlib import Path
+from loguru import logger
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils.config import Config
+from src.vectorstore.chunk_store import ChunkStore, chunk_store_dir
+from src.vectorstore.embeddings import embedding_registry
+from src.vectorstore.length_buckets import length_sorted_batches, padding_efficiency
+
+def run(embeddings, texts, batches):
+    """按给定切批编码，返回 (每秒文本块数, 填充效率)"""
+    useful = padded = 0
+    start_time = time.perf_counter()
+    for batch in batches:
+        batch_texts = [texts[i] for i in batch]
+        embeddings.embed_documents(batch_texts)
+        batch_useful, batch_padded = padding_efficiency([len(text) for text in batch_texts])
+        useful += batch_useful
+        padded += batch_padded
+    return len(texts) / (time.perf_counter() - start_time), useful / max(padded, 1)
+
+def main():
+    parser = argparse.ArgumentParser(description="长度分桶编码基准测试")
+    parser.add_argument("collection", help="collection名称（使用其文本块顺序存储作为语料）")
+    parser.add_argument("--texts", type=int, default=1024, help="编码的文本块数")
+    parser.add_argument("--batch-sizes", default="8,16,32,64", help="逗号分隔的批大小")
+    args = parser.parse_args()
+
+    store = ChunkStore(chunk_store_dir(args.collection))
+    texts = []
+    for seq in range(len(store.positions)):
+        chunk = store.get(seq)
+        if chunk:
+            texts.append(chunk["content"])
+        if len(texts) >= args.texts:
+            break
+
+    embeddings = embedding_registry.acquire(Config.EMBEDDING_MODEL, Config.EMBEDDING_DEVICE)
+    embeddings.embed_documents(texts[:4])  # 预热
+    logger.info(f"语料: {len(texts)} 个文本块 (书内顺序), 后端: {Config.EMBEDDING_BACKEND}")
+
+    for batch_size in [int(size) for size in args.batch_sizes.split(",")]:
+        sequential = [list(range(start, min(start + batch_size, len(texts)))) for start in range(0, len(texts), batch_size)]
+        base_rate, base_efficiency = run(embeddings, texts, sequential)
+        rate, efficiency = run(embeddings, texts, length_sorted_batches(texts, batch_size))
+        logger.info(
+            f"batch={batch_size:>3}: 原顺序 {base_rate:.1f} 块/秒 (填充效率 {base_efficiency:.0%}), "
+            f"分桶 {rate:.1f} 块/秒 (填充效率 {efficiency:.0%}), 提升 {rate / base_rate:.2f}x"
+        )
+
+if __name__ == "__main__":
+    main()
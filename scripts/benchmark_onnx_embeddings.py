@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+对比PyTorch与ONNX Runtime(fp32/int8) Embedding的向量一致性和编码速度
+
+fp32按余弦相似度判断能否直接替换现有collection的编码（不兼容时退出码1）；
+int8量化后余弦相似度通常低于0.99，按top-k检索一致率判断（不达标时退出码2）。
+"""
+import sys
+import time
+import argparse
+from pathlib import Path
+import numpy as np
+from loguru import logger
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils.config import Config
+from src.vectorstore.onnx_embeddings import OnnxEmbeddings
+
+SAMPLE_TEXTS = [
+    "队列研究是将人群按是否暴露于某可疑因素及其暴露程度分为不同的亚组，追踪其各自的结局。",
+    "病例对照研究以确诊患有某特定疾病的病人作为病例，以不患有该病但具有可比性的个体作为对照。",
+    "相对危险度是暴露组发病率与非暴露组发病率之比，反映暴露与发病的关联强度。",
+    "t检验适用于两组正态分布计量资料均数的比较，方差不齐时应使用校正t检验。",
+    "社会医学研究社会因素与健康之间的相互作用及其规律。",
+    "筛检是运用快速简便的试验、检查或其他方法，在健康人群中发现未被识别的可疑病人。",
+    "偏倚是指在研究设计、实施和分析过程中产生的系统误差。",
+    "卡方检验可用于推断两个或多个总体率或构成比之间有无差别。",
+]
+
+def load_texts(collection: str, limit: int):
+    """从文本块顺序存储取语料，没有时使用内置样例"""
+    if collection:
+        from src.vectorstore.chunk_store import ChunkStore, chunk_store_dir
+        store = ChunkStore(chunk_store_dir(collection))
+        texts = []
+        for seq in range(len(store.positions)):
+            chunk = store.get(seq)
+            if chunk:
+                texts.append(chunk["content"])
+            if len(texts) >= limit:
+                break
+        return texts
+    return (SAMPLE_TEXTS * (limit // len(SAMPLE_TEXTS) + 1))[:limit]
+
+def timed_encode(embeddings, texts):
+    """编码全部文本，返回(向量矩阵, 每秒文本块数)"""
+    embeddings.embed_documents(texts[:2])  # 预热
+    start_time = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    return vectors, len(texts) / (time.perf_counter() - start_time)
+
+def main():
+    parser = argparse.ArgumentParser(description="ONNX Embedding一致性与速度基准测试")
+    parser.add_argument("--model", default=Config.EMBEDDING_MODEL, help="模型名称")
+    parser.add_argument("--collection", default="", help="用该collection的文本块作语料（默认使用内置样例）")
+    parser.add_argument("--texts", type=int, default=256, help="编码的文本块数")
+    parser.add_argument("--top-k", type=int, default=5, help="检索一致性的k")
+    parser.add_argument("--min-cosine", type=float, default=0.99, help="ONNX fp32与PyTorch向量的最小余弦相似度，低于该值视为不兼容")
+    parser.add_argument("--min-int8-overlap", type=float, default=0.9,
+                        help="ONNX int8的最小top-k检索一致率，低于该值不建议开启ONNX_QUANTIZATION=int8")
+    args = parser.parse_args()
+
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+
+    texts = load_texts(args.collection, args.texts)
+    logger.info(f"语料: {len(texts)} 个文本块, 模型: {args.model}")
+
+    reference_model = HuggingFaceEmbeddings(
+        model_name=args.model,
+        model_kwargs={"device": "cpu"},
+        encode_kwargs={"normalize_embeddings": True, "batch_size": Config.EMBEDDING_BATCH_SIZE}
+    )
+    reference, reference_rate = timed_encode(reference_model, texts)
+    logger.info(f"{'torch':>10}: {reference_rate:.1f} 块/秒")
+
+    # 用前几条文本当查询，比较在语料上的top-k检索结果
+    queries = reference[:min(32, len(reference))]
+    reference_top = np.argsort(-(queries @ reference.T), axis=1)[:, :args.top_k]
+
+    fp32_compatible = True
+    int8_acceptable = True
+    for quantize in (False, True):
+        label = "onnx-int8" if quantize else "onnx-fp32"
+        vectors, rate = timed_encode(OnnxEmbeddings(args.model, quantize=quantize), texts)
+        cosine = np.sum(vectors * reference, axis=1)
+        top = np.argsort(-(vectors[:len(queries)] @ reference.T), axis=1)[:, :args.top_k]
+        overlap = np.mean([len(set(a) & set(b)) / args.top_k for a, b in zip(reference_top, top)])
+        logger.info(
+            f"{label:>10}: {rate:.1f} 块/秒 ({rate / reference_rate:.2f}x), "
+            f"余弦相似度 min {cosine.min():.5f} / mean {cosine.mean():.5f}, "
+            f"top-{args.top_k}一致率 {overlap:.4f}"
+        )
+        if not quantize and cosine.min() < args.min_cosine:
+            fp32_compatible = False
+            logger.warning(f"{label} 与现有collection的向量偏差超出容差 (min {cosine.min():.5f} < {args.min_cosine})")
+        if quantize and overlap < args.min_int8_overlap:
+            int8_acceptable = False
+            logger.warning(f"{label} 检索结果与PyTorch差异过大 (top-{args.top_k}一致率 {overlap:.4f} < {args.min_int8_overlap})")
+
+    if not fp32_compatible:
+        sys.exit(1)
+    sys.exit(0 if int8_acceptable else 2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""对比平铺索引不同压缩方式的内存占用、检索耗时和召回率"""
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+import numpy as np
+from loguru import logger
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.utils.config import Config
+from src.vectorstore.flat_index import FlatIndex, QUANTIZATIONS
+
+def recall_at_k(reference, results, k: int) -> float:
+    """压缩索引的top-k与全精度top-k的平均重合率"""
+    overlaps = [
+        len({i for i, _ in ref[:k]} & {i for i, _ in res[:k]}) / max(len(ref[:k]), 1)
+        for ref, res in zip(reference, results)
+    ]
+    return float(np.mean(overlaps)) if overlaps else 0.0
+
+def main():
+    parser = argparse.ArgumentParser(description="平铺索引压缩基准测试")
+    parser.add_argument("collection", help="collection名称（需已存在于FLAT_INDEX_PATH）")
+    parser.add_argument("--queries", type=int, default=200, help="采样的查询数")
+    parser.add_argument("--top-k", type=int, default=5, help="召回率的k")
+    args = parser.parse_args()
+
+    source = FlatIndex(str(Path(Config.FLAT_INDEX_PATH) / args.collection))
+    data = source.get()
+    matrix = np.asarray(data["embeddings"], dtype=np.float32)
+
+    # 用文档向量加噪声模拟查询
+    rng = np.random.default_rng(0)
+    queries = matrix[rng.choice(len(matrix), min(args.queries, len(matrix)), replace=False)]
+    queries = queries + rng.normal(scale=0.02, size=queries.shape).astype(np.float32)
+
+    reference = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for quantization in QUANTIZATIONS:
+            index = FlatIndex.build(
+                str(Path(tmp_dir) / quantization),
+                data["ids"], matrix, data["documents"], data["metadatas"],
+                quantization=quantization
+            )
+            start_time = time.perf_counter()
+            results = index.search(queries, args.top_k)
+            elapsed = (time.perf_counter() - start_time) / len(queries)
+            if reference is None:
+                reference = results
+
+            logger.info(
+                f"{quantization:>8}: 内存 {index.memory_bytes() / 1024 / 1024:.1f}MB, "
+                f"单次检索 {elapsed * 1000:.2f}ms, "
+                f"recall@{args.top_k} {recall_at_k(reference, results, args.top_k):.4f}"
+            )
+
+if __name__ == "__main__":
+    main()
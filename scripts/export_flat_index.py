@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""把Chroma collection导出为NumPy平铺索引（配合 VECTOR_DB=numpy 使用）"""
+import sys
+import argparse
+from pathlib import Path
+from loguru import logger
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.preprocessing.vectorstore_builder import VectorStoreBuilder
+from src.utils.config import Config
+
+def main():
+    parser = argparse.ArgumentParser(description="导出Chroma collection为NumPy平铺索引")
+    parser.add_argument("collections", nargs="*", help="collection名称，留空则导出全部")
+    parser.add_argument("--quantization", choices=["none", "float16", "int8"],
+                        default=Config.VECTOR_QUANTIZATION, help="向量压缩方式")
+    args = parser.parse_args()
+    
+    builder = VectorStoreBuilder()
+    builder.persist_dir = Config.CHROMA_PATH
+    collections = args.collections or builder.list_collections()
+    
+    logger.info(f"导出 {len(collections)} 个collection到 {Config.FLAT_INDEX_PATH}")
+    success_count = sum(1 for name in collections if builder.export_flat_index(name, args.quantization))
+    logger.info(f"导出完成: 成功 {success_count}/{len(collections)}")
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ from langchain_community.vectorstores import Chroma
 from loguru import logger
 from ..utils.config import Config
 from ..utils.llm_client import LLMClient
+from ..vectorstore.result_cache import retrieval_cache
 
 class RAGAgent:
     """RAG问答代理"""
@@ -40,6 +41,13 @@ class RAGAgent:
         if top_k is None:
             top_k = self.retrieval_top_k
         
+        cache_key = retrieval_cache.key(self.collection_name, query, "similarity", top_k)
+        cached = retrieval_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"命中检索结果缓存: {len(cached)} 个相关文档")
+            return list(cached)
+        generation = retrieval_cache.generation(self.collection_name)
+        
         try:
             # 使用相似性搜索
             docs = self.vectorstore.similarity_search(
@@ -48,6 +56,7 @@ class RAGAgent:
             )
             
             logger.info(f"检索到 {len(docs)} 个相关文档")
+            retrieval_cache.put(cache_key, list(docs), generation)
             return docs
             
         except Exception as e:
@@ -72,6 +81,15 @@ class RAGAgent:
         if top_k is None:
             top_k = self.retrieval_top_k
         
+        cache_key = retrieval_cache.key(
+            self.collection_name, query, "similarity_with_scores", top_k, self.retrieval_score_threshold
+        )
+        cached = retrieval_cache.get(cache_key)
+        if cached is not None:
+            logger.info(f"命中检索结果缓存: {len(cached)} 个相关文档")
+            return list(cached)
+        generation = retrieval_cache.generation(self.collection_name)
+        
         try:
             # 使用相似性搜索并返回分数
             docs_with_scores = self.vectorstore.similarity_search_with_score(
@@ -86,6 +104,7 @@ class RAGAgent:
             ]
             
             logger.info(f"检索到 {len(filtered_docs)} 个相关文档 (阈值: {self.retrieval_score_threshold})")
+            retrieval_cache.put(cache_key, list(filtered_docs), generation)
             return filtered_docs
             
         except Exception as e:
@@ -1,64 +1,102 @@
 """向量数据库构建模块"""
 from typing import List, Dict, Any, Optional
 from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.documents import Document
 from loguru import logger
 from ..utils.config import Config
+from ..vectorstore.handle_pool import collection_pool
+from ..vectorstore.embeddings import embedding_registry
+from ..vectorstore.query_cache import CachedQueryEmbeddings
+from ..vectorstore.lexical_index import LexicalIndex, lexical_index_dir
+from ..vectorstore.flat_index import FlatIndex, FlatVectorStore
+from ..vectorstore.chapter_index import ChapterIndex, chapter_index_dir
+from ..vectorstore.chunk_store import ChunkStore, chunk_store_dir
+from ..vectorstore.corpus_encoder import CorpusEncoder
+from ..vectorstore.embedding_cache import get_embedding_cache
+from ..vectorstore.embedding_server import RemoteEmbeddings
+from ..vectorstore.micro_batcher import BatchedQueryEmbeddings, query_batcher
 import os
 
 class VectorStoreBuilder:
     """向量数据库构建器"""
     
     def __init__(self):
-        self.embeddings = self._init_embeddings()
+        self._embeddings = None
+        self._corpus_encoder = None
+        self._model_name = None  # 实际使用的模型名称，区分各类向量缓存
+        self._remote = False
         self.db_type = Config.VECTOR_DB
-        self.persist_dir = Config.CHROMA_PATH
+        # numpy后端：每个collection一个内存映射矩阵目录
+        self.persist_dir = Config.FLAT_INDEX_PATH if self.db_type == "numpy" else Config.CHROMA_PATH
+    
+    @property
+    def embeddings(self):
+        """Embedding模型（首次使用时从全局注册表获取，进程内共享）"""
+        if self._embeddings is None:
+            self._embeddings = self._init_embeddings()
+        return self._embeddings
     
     def _init_embeddings(self):
-        """初始化Embedding模型，自动处理torch版本限制，优先使用含safetensors的模型"""
-        primary_model = getattr(Config, "EMBEDDING_MODEL", "BAAI/bge-large-zh-v1.5")
-        fallback_models = [
-            "BAAI/bge-m3",               # 多语通用，提供safetensors
-            "BAAI/bge-small-zh-v1.5"      # 轻量中文版，通常有safetensors
-        ]
-
-        model_kwargs = {"device": Config.EMBEDDING_DEVICE}
-        encode_kwargs = {"normalize_embeddings": True}
-
-        def _load(model_name: str):
-            logger.info(f"加载Embedding模型: {model_name}")
-            return HuggingFaceEmbeddings(
-                model_name=model_name,
-                model_kwargs=model_kwargs,
-                encode_kwargs=encode_kwargs
+        """
+        获取Embedding模型；查询编码走缓存
+        
+        配置了EMBEDDING_SERVER_SOCKET时连接共享Embedding服务，多个API worker共用一份模型；
+        否则从注册表获取，同一进程内只加载一次。
+        """
+        embeddings = None
+        if Config.EMBEDDING_SERVER_SOCKET:
+            try:
+                embeddings = RemoteEmbeddings(Config.EMBEDDING_SERVER_SOCKET)
+                self._model_name = embeddings.model_name
+                self._remote = True
+            except OSError as e:
+                logger.warning(f"连接Embedding服务失败，改为进程内加载模型: {e}")
+        if embeddings is None:
+            embeddings = embedding_registry.acquire(Config.EMBEDDING_MODEL, Config.EMBEDDING_DEVICE)
+            # 备用模型、ONNX int8的向量与主模型不同，按实际加载的模型区分缓存
+            self._model_name = embedding_registry.loaded_model(Config.EMBEDDING_MODEL, Config.EMBEDDING_DEVICE)
+        if Config.QUERY_BATCH_MAX_WAIT_MS > 0:
+            # 并发请求的查询编码合并成一次前向计算
+            embeddings = BatchedQueryEmbeddings(embeddings, query_batcher(embeddings))
+        if Config.QUERY_CACHE_SIZE > 0 or Config.QUERY_CACHE_PATH:
+            embeddings = CachedQueryEmbeddings(embeddings, self._model_name)
+        return embeddings
+    
+    @property
+    def corpus_encoder(self) -> CorpusEncoder:
+        """建库用的批量编码器（编码进程池跨collection复用，已编码过的文本块走向量缓存）"""
+        if self._corpus_encoder is None:
+            embeddings = self.embeddings
+            self._corpus_encoder = CorpusEncoder(
+                embeddings,
+                # 使用Embedding服务时由服务端合批，不再另起进程加载模型
+                workers=1 if self._remote else None,
+                cache=get_embedding_cache(self._model_name)
             )
-
-        # 尝试主模型
-        try:
-            embeddings = _load(primary_model)
-            logger.info("Embedding模型加载完成")
-            return embeddings
-        except Exception as e:
-            msg = str(e)
-            logger.warning(f"主模型加载失败: {e}")
-            # 若因torch>=2.6限制或权重为bin导致，回退到safetensors模型
-            if "torch.load" in msg or "v2.6" in msg or "safetensors" in msg or "load_state_dict" in msg:
-                for alt in fallback_models:
-                    try:
-                        logger.info(f"尝试备用Embedding模型: {alt}")
-                        embeddings = _load(alt)
-                        logger.info("备用Embedding模型加载完成")
-                        return embeddings
-                    except Exception as e2:
-                        logger.warning(f"备用模型加载失败 {alt}: {e2}")
-            # 其他错误直接抛出
-            raise
+        return self._corpus_encoder
+    
+    def embed_queries(self, questions: List[str]) -> List[List[float]]:
+        """批量编码问题（一次前向计算）"""
+        if hasattr(self.embeddings, "embed_queries"):
+            return self.embeddings.embed_queries(questions)
+        return self.embeddings.embed_documents(questions)
+    
+    def close(self):
+        """释放对Embedding模型的引用，关闭编码进程池"""
+        if self._corpus_encoder is not None:
+            self._corpus_encoder.shutdown()
+            self._corpus_encoder = None
+        if self._embeddings is not None:
+            if not self._remote:
+                embedding_registry.release(Config.EMBEDDING_MODEL, Config.EMBEDDING_DEVICE)
+            self._embeddings = None
+            self._remote = False
     
     def build_collection(self, 
                         collection_name: str,
                         chunks: List[Dict[str, Any]],
-                        force_rebuild: bool = False) -> Chroma:
+                        force_rebuild: bool = False,
+                        quantization: str = None) -> Chroma:
         """
         构建单个collection
         
@@ -66,6 +104,8 @@ class VectorStoreBuilder:
             collection_name: collection名称
             chunks: 文本块列表
             force_rebuild: 是否强制重建
+            quantization: 向量压缩方式 none/float16/int8（仅VECTOR_DB=numpy），
+                默认使用Config.VECTOR_QUANTIZATION
             
         Returns:
             Chroma向量数据库实例
@@ -77,11 +117,14 @@ class VectorStoreBuilder:
         # 检查是否已存在
         if os.path.exists(collection_path) and not force_rebuild:
             logger.info(f"Collection已存在，跳过: {collection_name}")
-            return Chroma(
-                collection_name=collection_name,
-                embedding_function=self.embeddings,
-                persist_directory=self.persist_dir
-            )
+            if not os.path.exists(lexical_index_dir(collection_name)):
+                self._build_lexical_index(collection_name, chunks)
+            if not os.path.exists(chunk_store_dir(collection_name)):
+                self._build_chunk_store(collection_name, chunks)
+            vectorstore = self.get_vectorstore(collection_name)
+            if vectorstore and not os.path.exists(chapter_index_dir(collection_name)):
+                self._build_chapter_index(collection_name, vectorstore)
+            return vectorstore
         
         # 转换为Document对象
         documents = []
@@ -94,17 +137,34 @@ class VectorStoreBuilder:
         
         logger.info(f"准备插入 {len(documents)} 个文档")
         
+        # 旧句柄（包括BM25索引）指向被替换的collection，必须失效
+        collection_pool.invalidate(collection_name)
+        
+        quantization = quantization or Config.VECTOR_QUANTIZATION
+        if quantization != "none" and self.db_type != "numpy":
+            logger.warning(f"向量压缩仅支持VECTOR_DB=numpy，忽略: {quantization}")
+        
         # 创建向量数据库
         try:
-            vectorstore = Chroma.from_documents(
-                documents=documents,
-                embedding=self.embeddings,
-                collection_name=collection_name,
-                persist_directory=self.persist_dir
-            )
+            if self.db_type == "numpy":
+                vectorstore = self._build_flat_index(collection_name, documents, quantization)
+            else:
+                vectorstore = self._build_chroma(collection_name, documents)
             
             logger.info(f"✓ Collection构建完成: {collection_name}")
-            return vectorstore
+            
+            # 用同一批文本块构建BM25索引和顺序存储，用已写入的向量构建章节路由索引
+            self._build_lexical_index(collection_name, chunks)
+            self._build_chunk_store(collection_name, chunks)
+            self._build_chapter_index(collection_name, vectorstore)
+            
+            # 构建期间打开的句柄和写入的缓存可能读到了旧数据，写完后再失效一次
+            collection_pool.invalidate(collection_name)
+            
+            return collection_pool.get(
+                (self.persist_dir, collection_name),
+                lambda: vectorstore
+            )
             
         except Exception as e:
             logger.error(f"✗ Collection构建失败: {e}")
@@ -125,17 +185,22 @@ class VectorStoreBuilder:
         success_count = 0
         failed_collections = []
         
-        for collection_name, chunks in all_chunks.items():
-            try:
-                self.build_collection(
-                    collection_name=collection_name,
-                    chunks=chunks,
-                    force_rebuild=force_rebuild
-                )
-                success_count += 1
-            except Exception as e:
-                logger.error(f"Collection构建失败: {collection_name}, 错误: {e}")
-                failed_collections.append(collection_name)
+        try:
+            for collection_name, chunks in all_chunks.items():
+                try:
+                    self.build_collection(
+                        collection_name=collection_name,
+                        chunks=chunks,
+                        force_rebuild=force_rebuild
+                    )
+                    success_count += 1
+                except Exception as e:
+                    logger.error(f"Collection构建失败: {collection_name}, 错误: {e}")
+                    failed_collections.append(collection_name)
+        finally:
+            # 编码进程各持有一份模型，批量构建结束后释放
+            if self._corpus_encoder is not None:
+                self._corpus_encoder.shutdown()
         
         logger.info(f"构建完成: 成功 {success_count}/{len(all_chunks)}")
         if failed_collections:
@@ -145,6 +210,8 @@ class VectorStoreBuilder:
         """
         获取已存在的vectorstore
         
+        同一进程内每个collection只打开一次，之后从句柄池复用。
+        
         Args:
             collection_name: collection名称
             
@@ -155,9 +222,23 @@ class VectorStoreBuilder:
         
         if not os.path.exists(collection_path):
             logger.warning(f"Collection不存在: {collection_name}")
+            collection_pool.invalidate(collection_name, self.persist_dir, broadcast=False)
             return None
         
+        return collection_pool.get(
+            (self.persist_dir, collection_name),
+            lambda: self._open_vectorstore(collection_name)
+        )
+    
+    def _open_vectorstore(self, collection_name: str) -> Optional[Chroma]:
+        """打开collection（仅在句柄池未命中时调用）"""
         try:
+            logger.info(f"打开collection: {collection_name}")
+            if self.db_type == "numpy":
+                return FlatVectorStore(
+                    FlatIndex(os.path.join(self.persist_dir, collection_name)),
+                    self.embeddings
+                )
             vectorstore = Chroma(
                 collection_name=collection_name,
                 embedding_function=self.embeddings,
@@ -168,6 +249,201 @@ class VectorStoreBuilder:
             logger.error(f"加载vectorstore失败: {e}")
             return None
     
+    def _build_flat_index(self,
+                          collection_name: str,
+                          documents: List[Document],
+                          quantization: str = "none") -> FlatVectorStore:
+        """编码文档并写入平铺索引（VECTOR_DB=numpy）"""
+        texts = [doc.page_content for doc in documents]
+        embeddings = [
+            vector
+            for _, vectors in self.corpus_encoder.encode(texts, collection_name)
+            for vector in vectors
+        ]
+        index = FlatIndex.build(
+            os.path.join(self.persist_dir, collection_name),
+            [f"{collection_name}_{i}" for i in range(len(documents))],
+            embeddings,
+            texts,
+            [doc.metadata for doc in documents],
+            quantization=quantization
+        )
+        return FlatVectorStore(index, self.embeddings)
+    
+    def _build_chroma(self, collection_name: str, documents: List[Document]) -> Chroma:
+        """
+        分批编码文档并分批写入Chroma
+        
+        编码器按顺序逐批产出向量，攒够VECTORSTORE_UPSERT_BATCH条就写入一次，
+        编码和写入交替进行，不需要把整本书的向量都放在内存里。
+        """
+        vectorstore = Chroma(
+            collection_name=collection_name,
+            embedding_function=self.embeddings,
+            persist_directory=self.persist_dir
+        )
+        # 重建时先清空旧数据，避免新旧文本块混在一起
+        if vectorstore._collection.count():
+            vectorstore.delete_collection()
+            vectorstore = Chroma(
+                collection_name=collection_name,
+                embedding_function=self.embeddings,
+                persist_directory=self.persist_dir
+            )
+        
+        collection = vectorstore._collection
+        texts = [doc.page_content for doc in documents]
+        metadatas = [doc.metadata for doc in documents]
+        ids = [f"{collection_name}_{i}" for i in range(len(documents))]
+        upsert_batch = max(1, Config.VECTORSTORE_UPSERT_BATCH)
+        
+        written = 0
+        buffered = []
+        for _, vectors in self.corpus_encoder.encode(texts, collection_name):
+            buffered.extend(vectors)
+            while len(buffered) >= upsert_batch or (buffered and written + len(buffered) == len(texts)):
+                n = min(upsert_batch, len(buffered))
+                collection.upsert(
+                    ids=ids[written:written + n],
+                    embeddings=buffered[:n],
+                    documents=texts[written:written + n],
+                    metadatas=metadatas[written:written + n]
+                )
+                written += n
+                buffered = buffered[n:]
+                logger.info(f"写入进度 {collection_name}: {written}/{len(texts)}")
+        
+        return vectorstore
+    
+    def export_flat_index(self, collection_name: str, quantization: str = None) -> bool:
+        """
+        把已有的Chroma collection导出为平铺索引（无需重新编码）
+        
+        导出后设置 VECTOR_DB=numpy 即可切换到NumPy检索。
+        
+        Args:
+            collection_name: collection名称
+            quantization: 向量压缩方式，默认使用Config.VECTOR_QUANTIZATION
+            
+        Returns:
+            是否导出成功
+        """
+        try:
+            collection = Chroma(
+                collection_name=collection_name,
+                embedding_function=self.embeddings,
+                persist_directory=Config.CHROMA_PATH
+            )._collection
+            data = collection.get(include=["embeddings", "documents", "metadatas"])
+            
+            FlatIndex.build(
+                os.path.join(Config.FLAT_INDEX_PATH, collection_name),
+                data["ids"],
+                data["embeddings"],
+                data["documents"],
+                [metadata or {} for metadata in data["metadatas"]],
+                quantization=quantization or Config.VECTOR_QUANTIZATION
+            )
+            collection_pool.invalidate(collection_name, Config.FLAT_INDEX_PATH)
+            
+            logger.info(f"✓ 平铺索引导出完成: {collection_name} ({len(data['ids'])} 个文档)")
+            return True
+            
+        except Exception as e:
+            logger.error(f"✗ 平铺索引导出失败: {collection_name}, 错误: {e}")
+            return False
+    
+    def _build_lexical_index(self, collection_name: str, chunks: List[Dict[str, Any]]):
+        """构建collection的BM25索引（失败不影响向量库）"""
+        try:
+            LexicalIndex.build(
+                lexical_index_dir(collection_name),
+                [chunk["content"] for chunk in chunks],
+                [chunk["metadata"] for chunk in chunks]
+            )
+        except Exception as e:
+            logger.warning(f"BM25索引构建失败: {collection_name}, 错误: {e}")
+    
+    def _build_chapter_index(self, collection_name: str, vectorstore):
+        """用collection中已有的向量构建章节路由索引（失败不影响向量库）"""
+        try:
+            data = vectorstore._collection.get(include=["embeddings", "metadatas"])
+            ChapterIndex.build(
+                chapter_index_dir(collection_name),
+                data["ids"],
+                data["embeddings"],
+                data["metadatas"]
+            )
+        except Exception as e:
+            logger.warning(f"章节路由索引构建失败: {collection_name}, 错误: {e}")
+    
+    def get_chapter_index(self, collection_name: str) -> Optional[ChapterIndex]:
+        """
+        获取collection的章节路由索引
+        
+        Returns:
+            ChapterIndex实例，如果索引不存在返回None
+        """
+        index_dir = chapter_index_dir(collection_name)
+        if not os.path.exists(index_dir):
+            return None
+        
+        def _open():
+            try:
+                return ChapterIndex(index_dir)
+            except Exception as e:
+                logger.warning(f"加载章节路由索引失败: {e}")
+                return None
+        
+        return collection_pool.get((Config.CHAPTER_INDEX_PATH, collection_name), _open)
+    
+    def _build_chunk_store(self, collection_name: str, chunks: List[Dict[str, Any]]):
+        """构建collection的文本块顺序存储（失败不影响向量库）"""
+        try:
+            ChunkStore.build(chunk_store_dir(collection_name), chunks)
+        except Exception as e:
+            logger.warning(f"文本块顺序存储构建失败: {collection_name}, 错误: {e}")
+    
+    def get_chunk_store(self, collection_name: str) -> Optional[ChunkStore]:
+        """
+        获取collection的文本块顺序存储
+        
+        Returns:
+            ChunkStore实例，如果不存在返回None
+        """
+        store_dir = chunk_store_dir(collection_name)
+        if not os.path.exists(store_dir):
+            return None
+        
+        def _open():
+            try:
+                return ChunkStore(store_dir)
+            except Exception as e:
+                logger.warning(f"加载文本块顺序存储失败: {e}")
+                return None
+        
+        return collection_pool.get((Config.CHUNK_STORE_PATH, collection_name), _open)
+    
+    def get_lexical_index(self, collection_name: str) -> Optional[LexicalIndex]:
+        """
+        获取collection的BM25索引
+        
+        Returns:
+            LexicalIndex实例，如果索引不存在返回None
+        """
+        index_dir = lexical_index_dir(collection_name)
+        if not os.path.exists(index_dir):
+            return None
+        
+        def _open():
+            try:
+                return LexicalIndex(index_dir)
+            except Exception as e:
+                logger.warning(f"加载BM25索引失败: {e}")
+                return None
+        
+        return collection_pool.get((Config.LEXICAL_INDEX_PATH, collection_name), _open)
+    
     def list_collections(self) -> List[str]:
         """列出所有可用的collections"""
         if not os.path.exists(self.persist_dir):
@@ -184,6 +460,14 @@ class VectorStoreBuilder:
         """删除指定collection"""
         import shutil
         
+        collection_pool.invalidate(collection_name)
+        
+        for index_dir in (lexical_index_dir(collection_name),
+                          chapter_index_dir(collection_name),
+                          chunk_store_dir(collection_name)):
+            if os.path.exists(index_dir):
+                shutil.rmtree(index_dir)
+        
         collection_path = os.path.join(self.persist_dir, collection_name)
         if os.path.exists(collection_path):
             shutil.rmtree(collection_path)
@@ -0,0 +1,3 @@
+"""
+向量存储模块
+"""
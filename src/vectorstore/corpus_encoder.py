@@ -0,0 +1,186 @@
+"""语料编码器 - 建库时分批、多进程编码文本块"""
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+from loguru import logger
+from ..utils.config import Config
+from .embedding_cache import EmbeddingCache, text_digest
+from .length_buckets import length_sorted_batches, padding_efficiency
+
+# 子进程内的Embedding模型（进程初始化时加载）
+_worker_embeddings = None
+
+def _init_worker(model_name: str, device: str, num_threads: int):
+    """子进程初始化：限制每个进程的计算线程数，加载一份Embedding模型"""
+    global _worker_embeddings
+    try:
+        import torch
+        torch.set_num_threads(num_threads)
+    except ImportError:
+        pass
+    Config.ONNX_NUM_THREADS = num_threads
+    from .embeddings import embedding_registry
+    _worker_embeddings = embedding_registry.acquire(model_name, device)
+
+def _encode_batch(texts: List[str]) -> List[List[float]]:
+    return _worker_embeddings.embed_documents(texts)
+
+class CorpusEncoder:
+    """
+    语料编码器
+
+    按EMBEDDING_BATCH_SIZE把文本切批。EMBEDDING_WORKERS > 1 且运行在CPU上时，
+    批次分发到多进程池并行编码（每个进程各加载一份模型，计算线程数按核数均分）；
+    否则在当前进程内逐批编码。结果按原顺序逐批产出，调用方可以边编码边写入。
+    进程池在首次使用时创建，之后跨collection复用，shutdown()时释放。
+    提供向量缓存时先按文本sha256查缓存，只编码未命中的文本块，编码结果写回缓存。
+    """
+
+    # 每次按长度排序的范围（批数），越大补齐越少，但每段产出前要等的批次越多
+    BUCKET_BATCHES = 32
+
+    def __init__(self,
+                 embeddings,
+                 model_name: str = None,
+                 device: str = None,
+                 batch_size: int = None,
+                 workers: int = None,
+                 cache: EmbeddingCache = None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name or Config.EMBEDDING_MODEL
+        self.device = device or Config.EMBEDDING_DEVICE
+        self.batch_size = max(1, batch_size or Config.EMBEDDING_BATCH_SIZE)
+        workers = Config.EMBEDDING_WORKERS if workers is None else workers
+        self.workers = workers if workers > 0 else min(os.cpu_count() or 1, 4)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            num_threads = max(1, (os.cpu_count() or 1) // self.workers)
+            logger.info(f"启动编码进程池: {self.workers} 个进程, 每个进程 {num_threads} 个线程")
+            # torch在fork出的子进程中可能死锁，使用spawn
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.model_name, self.device, num_threads)
+            )
+        return self._pool
+
+    def encode(self, texts: List[str], label: str = "") -> Iterator[Tuple[int, List[List[float]]]]:
+        """
+        按顺序逐批编码（命中缓存的文本块不再编码）
+
+        Args:
+            texts: 待编码文本
+            label: 进度日志中的名称（通常为collection名称）
+
+        Yields:
+            (批次起始下标, 该批向量)，各批首尾相接覆盖全部文本
+        """
+        if self.cache is None:
+            yield from self._encode(texts, label)
+            return
+
+        total = len(texts)
+        digests = [text_digest(text) for text in texts]
+        vectors = [None if v is None else v.tolist() for v in self.cache.get_many(digests)]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        logger.info(f"向量缓存 {label}: 命中 {total - len(missing)}/{total}, 需编码 {len(missing)} 个文本块")
+
+        emitted = 0
+        for start, batch in self._encode([texts[i] for i in missing], label):
+            rows = missing[start:start + len(batch)]
+            for i, vector in zip(rows, batch):
+                vectors[i] = vector
+            self.cache.put_many([digests[i] for i in rows], batch)
+            # 下一个未命中的文本块之前的向量都已就绪
+            end = start + len(batch)
+            ready = missing[end] if end < len(missing) else total
+            yield emitted, vectors[emitted:ready]
+            emitted = ready
+        if emitted < total:
+            yield emitted, vectors[emitted:]
+
+    def _encode(self, texts: List[str], label: str) -> Iterator[Tuple[int, List[List[float]]]]:
+        """
+        不查缓存，按顺序逐段编码
+
+        每段 BUCKET_BATCHES 批文本先按长度排序再切批，同一批内长度相近，补齐浪费小；
+        编码结果按原顺序还原后整段产出，内存中最多保留一段向量。
+        """
+        total = len(texts)
+        if not total:
+            return
+        window = self.batch_size * self.BUCKET_BATCHES
+        # (段起始下标, 该批文本下标)
+        batches = [
+            (start, batch)
+            for start in range(0, total, window)
+            for batch in length_sorted_batches(texts[start:start + window], self.batch_size, offset=start)
+        ]
+        parallel = self.workers > 1 and self.device == "cpu" and len(batches) > 1
+        logger.info(
+            f"开始编码 {label}: {total} 个文本块, {len(batches)} 批, "
+            f"{'%d 个进程' % self.workers if parallel else '单进程'}"
+        )
+
+        start_time = time.perf_counter()
+        done = 0
+        last_report = start_time
+        useful = padded = 0
+
+        if parallel:
+            pool = self._get_pool()
+            # 最多提交 2×进程数 个批次，避免一次把整本书的文本都压进队列
+            in_flight = self.workers * 2
+            futures = {}
+            next_batch = 0
+
+        segment = {}
+        for i, (segment_start, batch) in enumerate(batches):
+            batch_texts = [texts[j] for j in batch]
+            if parallel:
+                while next_batch < len(batches) and next_batch < i + in_flight:
+                    futures[next_batch] = pool.submit(_encode_batch, [texts[j] for j in batches[next_batch][1]])
+                    next_batch += 1
+                vectors = futures.pop(i).result()
+            else:
+                vectors = self.embeddings.embed_documents(batch_texts)
+
+            segment.update(zip(batch, vectors))
+            batch_useful, batch_padded = padding_efficiency([len(text) for text in batch_texts])
+            useful += batch_useful
+            padded += batch_padded
+            done += len(vectors)
+            last_report = self._report(label, done, total, start_time, last_report)
+
+            # 一段的最后一批完成后按原顺序产出整段
+            if i + 1 == len(batches) or batches[i + 1][0] != segment_start:
+                yield segment_start, [segment[j] for j in range(segment_start, segment_start + len(segment))]
+                segment = {}
+
+        elapsed = time.perf_counter() - start_time
+        logger.info(
+            f"✓ 编码完成 {label}: {total} 个文本块, 耗时 {elapsed:.1f}s "
+            f"({total / max(elapsed, 1e-9):.1f} 块/秒, 填充效率 {useful / max(padded, 1):.0%})"
+        )
+
+    def _report(self, label: str, done: int, total: int, start_time: float, last_report: float) -> float:
+        """每5秒或全部完成时输出一次进度"""
+        now = time.perf_counter()
+        if done < total and now - last_report < 5:
+            return last_report
+        rate = done / max(now - start_time, 1e-9)
+        remaining = (total - done) / rate if rate else 0.0
+        logger.info(f"编码进度 {label}: {done}/{total} ({done / total:.0%}), {rate:.1f} 块/秒, 预计剩余 {remaining:.0f}s")
+        return now
+
+    def shutdown(self):
+        """关闭进程池"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
@@ -0,0 +1,53 @@
+"""检索结果多样化 - 近重复合并 + 最大边际相关性（MMR）"""
+from typing import List, Sequence
+import numpy as np
+
+def maximal_marginal_relevance(query_embedding: Sequence[float],
+                               embeddings: Sequence[Sequence[float]],
+                               k: int,
+                               lambda_mult: float = 0.7,
+                               duplicate_threshold: float = 0.95) -> List[int]:
+    """
+    从候选中选出k个既相关又互不重复的文档
+
+    文本块之间有重叠，相邻块的向量非常接近。每选中一个文档，与它余弦相似度
+    不低于duplicate_threshold的候选直接剔除（近重复合并）；其余候选按
+    lambda_mult * 相关度 - (1 - lambda_mult) * 与已选文档的最大相似度 打分。
+
+    Args:
+        query_embedding: 问题向量
+        embeddings: 候选文档向量，按检索顺序排列
+        k: 选出的数量
+        lambda_mult: 相关性权重，1.0时只做近重复合并
+        duplicate_threshold: 近重复判定阈值
+
+    Returns:
+        选中候选的下标，按选中顺序排列
+    """
+    docs = np.asarray(embeddings, dtype=np.float32)
+    if docs.ndim != 2 or not len(docs) or k <= 0:
+        return []
+    docs = docs / np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    query = np.asarray(query_embedding, dtype=np.float32).ravel()
+    query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+    relevance = docs @ query
+    similarity = docs @ docs.T
+
+    selected: List[int] = []
+    available = np.ones(len(docs), dtype=bool)
+    max_similarity = np.zeros(len(docs), dtype=np.float32)
+    while len(selected) < k and available.any():
+        if selected:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+
+        selected.append(best)
+        available[best] = False
+        available &= similarity[best] < duplicate_threshold
+        np.maximum(max_similarity, similarity[best], out=max_similarity)
+
+    return selected
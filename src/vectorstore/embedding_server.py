@@ -0,0 +1,189 @@
+"""共享Embedding服务 - 单独进程持有模型，经Unix socket为多个API worker编码并合批"""
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+from typing import Any, Dict, List
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+from ..utils.config import Config
+from .micro_batcher import MicroBatcher
+
+# 协议：每帧为4字节大端长度 + 内容
+#   请求内容：JSON {"op": "embed", "texts": [...]} 或 {"op": "info"}
+#   响应内容：1字节状态 + 负载
+#       状态0 embed：uint32 条数 + uint32 维度 + float32向量
+#       状态0 info： JSON {"model", "dim", ...}
+#       状态1：      UTF-8错误信息
+_FRAME = struct.Struct(">I")
+_SHAPE = struct.Struct(">II")
+_OK, _ERROR = 0, 1
+
+def _send_frame(sock: socket.socket, payload: bytes):
+    sock.sendall(_FRAME.pack(len(payload)) + payload)
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("连接已关闭")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+def _recv_frame(sock: socket.socket) -> bytes:
+    (size,) = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    return _recv_exact(sock, size)
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Embedding服务进程
+
+    每个客户端连接一个处理线程，连接可复用；各连接的编码请求由MicroBatcher合批。
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, embeddings, model_name: str,
+                 max_batch: int = None, max_wait_ms: float = None):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+        self.model_name = model_name
+        self.dim = len(embeddings.embed_query("维度探测"))
+        self.batcher = MicroBatcher(
+            embeddings.embed_documents,
+            max_batch or Config.EMBEDDING_SERVER_MAX_BATCH,
+            Config.EMBEDDING_SERVER_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms,
+            name="embedding-batcher",
+            timeout=Config.EMBEDDING_SERVER_TIMEOUT
+        )
+        super().__init__(socket_path, _Handler)
+        # 只允许启动服务的用户连接
+        os.chmod(socket_path, 0o600)
+
+    def info(self) -> Dict[str, Any]:
+        return {"model": self.model_name, "dim": self.dim, **self.batcher.stats()}
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                frame = _recv_frame(self.request)
+            except (ConnectionError, OSError):
+                return
+            try:
+                request = json.loads(frame)
+                if request.get("op") == "info":
+                    payload = bytes([_OK]) + json.dumps(self.server.info()).encode("utf-8")
+                else:
+                    texts = list(request["texts"])
+                    vectors = np.asarray(self.server.batcher.encode(texts), dtype=np.float32)
+                    vectors = vectors.reshape(len(texts), self.server.dim)
+                    payload = bytes([_OK]) + _SHAPE.pack(*vectors.shape) + vectors.tobytes()
+            except Exception as e:
+                payload = bytes([_ERROR]) + str(e).encode("utf-8")
+            try:
+                _send_frame(self.request, payload)
+            except OSError:
+                return
+
+class RemoteEmbeddings(Embeddings):
+    """
+    Embedding服务的客户端
+
+    每个线程各用一条长连接。复用的连接在发送请求时已断开（服务重启）时重连并重发一次；
+    请求发出后的超时或断开直接抛出，不再重发，避免服务端重复编码、调用方等待两倍超时。
+    """
+
+    backend = "remote"
+
+    def __init__(self, socket_path: str = None, timeout: float = None):
+        self.socket_path = socket_path or Config.EMBEDDING_SERVER_SOCKET
+        self.timeout = timeout or Config.EMBEDDING_SERVER_TIMEOUT
+        self._local = threading.local()
+        info = self.info()
+        self.model_name = info["model"]
+        self.dim = info["dim"]
+        logger.info(f"已连接Embedding服务: {self.socket_path} (模型 {self.model_name})")
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _call(self, request: Dict[str, Any]) -> bytes:
+        body = json.dumps(request, ensure_ascii=False).encode("utf-8")
+        reused = getattr(self._local, "sock", None) is not None
+        try:
+            sock = self._connection()
+            try:
+                _send_frame(sock, body)
+            except ConnectionError:
+                # 请求尚未送达，服务端不会处理，可以安全地重连重发
+                if not reused:
+                    raise
+                self._reset()
+                sock = self._connection()
+                _send_frame(sock, body)
+            response = _recv_frame(sock)
+        except OSError:
+            # 包括socket.timeout：连接状态未知，丢弃后由下次请求重连
+            self._reset()
+            raise
+        if response[0] != _OK:
+            raise RuntimeError(f"Embedding服务出错: {response[1:].decode('utf-8', 'replace')}")
+        return response[1:]
+
+    def _reset(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+            self._local.sock = None
+
+    def info(self) -> Dict[str, Any]:
+        """服务端模型信息和合批统计"""
+        return json.loads(self._call({"op": "info"}))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        payload = self._call({"op": "embed", "texts": texts})
+        count, dim = _SHAPE.unpack_from(payload)
+        return np.frombuffer(payload, dtype=np.float32, offset=_SHAPE.size).reshape(count, dim).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+def main():
+    """启动Embedding服务：python -m src.vectorstore.embedding_server"""
+    from .embeddings import embedding_registry
+
+    socket_path = Config.EMBEDDING_SERVER_SOCKET
+    if not socket_path:
+        raise SystemExit("未设置EMBEDDING_SERVER_SOCKET")
+
+    embeddings = embedding_registry.acquire(Config.EMBEDDING_MODEL, Config.EMBEDDING_DEVICE)
+    model_name = embedding_registry.loaded_model(Config.EMBEDDING_MODEL, Config.EMBEDDING_DEVICE)
+    server = EmbeddingServer(socket_path, embeddings, model_name)
+    logger.info(f"Embedding服务已启动: {socket_path} (模型 {model_name}, 维度 {server.dim})")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Embedding模型注册表 - 进程内共享同一份模型"""
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from loguru import logger
+from ..utils.config import Config
+
+# 主模型因torch版本限制无法加载时的备用模型（均提供safetensors权重）
+FALLBACK_MODELS = [
+    "BAAI/bge-m3",               # 多语通用，提供safetensors
+    "BAAI/bge-small-zh-v1.5"      # 轻量中文版，通常有safetensors
+]
+
+class EmbeddingRegistry:
+    """
+    Embedding模型注册表
+
+    按 (模型名, 设备) 懒加载，每个进程每个模型只保留一份；
+    记录加载耗时、内存占用和引用计数。
+    加载在每个模型各自的锁内进行，全局锁只保护字典，加载期间stats()和其他模型不受影响。
+    """
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._loading: Dict[Tuple[str, str], threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, model_name: str = None, device: str = None):
+        """
+        获取Embedding模型（首次调用时加载），引用计数+1
+
+        Args:
+            model_name: 模型名称，默认使用Config.EMBEDDING_MODEL
+            device: 运行设备，默认使用Config.EMBEDDING_DEVICE
+
+        Returns:
+            Embedding模型实例
+        """
+        key = self._key(model_name, device)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry["ref_count"] += 1
+                return entry["embeddings"]
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        # 同一模型的并发请求等第一个加载完成，不会重复加载
+        with loading:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry["ref_count"] += 1
+                    return entry["embeddings"]
+
+            entry = self._load(*key)
+
+            with self._lock:
+                self._entries[key] = entry
+                self._loading.pop(key, None)
+                entry["ref_count"] += 1
+                return entry["embeddings"]
+
+    def release(self, model_name: str = None, device: str = None):
+        """引用计数-1（模型保持加载，供后续请求复用）"""
+        key = self._key(model_name, device)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["ref_count"] > 0:
+                entry["ref_count"] -= 1
+
+    def unload(self, model_name: str = None, device: str = None) -> bool:
+        """卸载未被引用的模型"""
+        key = self._key(model_name, device)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return False
+            if entry["ref_count"] > 0:
+                logger.warning(f"模型仍被引用，无法卸载: {key[0]} (引用数: {entry['ref_count']})")
+                return False
+            del self._entries[key]
+
+        logger.info(f"已卸载Embedding模型: {key[0]}")
+        return True
+
+    def loaded_model(self, model_name: str = None, device: str = None) -> str:
+        """实际加载的模型名称（主模型加载失败时为备用模型），未加载时返回请求的模型名"""
+        key = self._key(model_name, device)
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry["loaded_model"] if entry else key[0]
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """已加载模型的统计信息"""
+        with self._lock:
+            return [
+                {
+                    "model": model_name,
+                    "device": device,
+                    "loaded_model": entry["loaded_model"],
+                    "backend": entry["backend"],
+                    "load_time": entry["load_time"],
+                    "memory_bytes": entry["memory_bytes"],
+                    "ref_count": entry["ref_count"]
+                }
+                for (model_name, device), entry in self._entries.items()
+            ]
+
+    def _key(self, model_name: str = None, device: str = None) -> Tuple[str, str]:
+        return (
+            model_name or getattr(Config, "EMBEDDING_MODEL", "BAAI/bge-large-zh-v1.5"),
+            device or Config.EMBEDDING_DEVICE
+        )
+
+    def _load(self, model_name: str, device: str) -> Dict[str, Any]:
+        """加载模型，自动处理torch版本限制，优先使用含safetensors的模型"""
+        start_time = time.perf_counter()
+        embeddings, loaded_model = self._load_with_fallback(model_name, device)
+        load_time = time.perf_counter() - start_time
+
+        memory_bytes = self._estimate_memory(embeddings)
+        logger.info(
+            f"Embedding模型加载完成: {loaded_model} ({device}), "
+            f"耗时 {load_time:.1f}s, 内存约 {memory_bytes / 1024 / 1024:.0f}MB"
+        )
+
+        return {
+            "embeddings": embeddings,
+            "loaded_model": loaded_model,
+            "backend": getattr(embeddings, "backend", "torch"),
+            "load_time": load_time,
+            "memory_bytes": memory_bytes,
+            "ref_count": 0
+        }
+
+    def _load_with_fallback(self, model_name: str, device: str):
+        if Config.EMBEDDING_BACKEND == "onnx":
+            try:
+                return self._load_onnx(model_name)
+            except Exception as e:
+                logger.warning(f"ONNX后端加载失败，改用PyTorch: {e}")
+        
+        model_kwargs = {"device": device}
+        encode_kwargs = {"normalize_embeddings": True}
+
+        def _load(name: str):
+            logger.info(f"加载Embedding模型: {name}")
+            return HuggingFaceEmbeddings(
+                model_name=name,
+                model_kwargs=model_kwargs,
+                encode_kwargs=encode_kwargs
+            )
+
+        # 尝试主模型
+        try:
+            return _load(model_name), model_name
+        except Exception as e:
+            msg = str(e)
+            logger.warning(f"主模型加载失败: {e}")
+            # 若因torch>=2.6限制或权重为bin导致，回退到safetensors模型
+            if "torch.load" in msg or "v2.6" in msg or "safetensors" in msg or "load_state_dict" in msg:
+                for alt in FALLBACK_MODELS:
+                    try:
+                        logger.info(f"尝试备用Embedding模型: {alt}")
+                        return _load(alt), alt
+                    except Exception as e2:
+                        logger.warning(f"备用模型加载失败 {alt}: {e2}")
+            # 其他错误直接抛出
+            raise
+
+    def _load_onnx(self, model_name: str):
+        """加载ONNX Runtime后端（首次使用时导出计算图）"""
+        from .onnx_embeddings import OnnxEmbeddings
+        quantize = Config.ONNX_QUANTIZATION == "int8"
+        logger.info(f"加载Embedding模型(ONNX{' int8' if quantize else ''}): {model_name}")
+        embeddings = OnnxEmbeddings(model_name, quantize=quantize)
+        # int8向量与原模型有可见偏差，换一个名称，避免和PyTorch编码的向量缓存混用
+        return embeddings, f"{model_name}@onnx-int8" if quantize else model_name
+
+    def _estimate_memory(self, embeddings) -> int:
+        """按模型参数估算内存占用（字节）"""
+        if hasattr(embeddings, "model_bytes"):
+            return embeddings.model_bytes
+        client = getattr(embeddings, "client", None)
+        try:
+            return sum(p.numel() * p.element_size() for p in client.parameters())
+        except Exception:
+            return 0
+
+# 全局Embedding模型注册表
+embedding_registry = EmbeddingRegistry()
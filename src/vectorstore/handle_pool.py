@@ -0,0 +1,199 @@
+"""Collection句柄池 - 进程内复用已打开的向量库实例"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from loguru import logger
+from ..utils.config import Config
+
+def _marker_path(collection_name: str) -> str:
+    return os.path.join(Config.COLLECTION_MARKER_PATH, re.sub(r"[^\w.-]", "_", collection_name))
+
+def _disk_stamp(collection_name: str) -> Optional[Tuple[int, int]]:
+    """collection标记文件的 (inode, 修改时间)，标记不存在时为None"""
+    try:
+        stat = os.stat(_marker_path(collection_name))
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns)
+
+def _touch_marker(collection_name: str):
+    """原子替换collection的标记文件，通知其他进程该collection已变化"""
+    path = _marker_path(collection_name)
+    try:
+        os.makedirs(Config.COLLECTION_MARKER_PATH, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(f"{time.time_ns()}\n")
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"写入collection标记失败，其他进程可能继续使用旧缓存: {e}")
+
+class CollectionHandlePool:
+    """
+    进程级Collection句柄池
+
+    每个collection只打开一次并长期复用；容量按collection计（一个collection的向量库、
+    BM25、章节和顺序存储句柄合计占一个名额），超过上限时按LRU淘汰整个collection的句柄。
+    collection重建或删除时通过invalidate()让旧句柄失效，同时递增该collection的
+    代数（generation），依赖collection内容的缓存据此判断是否过期。
+
+    建库脚本和API服务是不同的进程，invalidate()还会替换磁盘上该collection的标记文件；
+    代数由进程内计数和标记文件的 (inode, 修改时间) 组成，句柄和缓存都会发现其他进程的重建。
+    """
+    
+    def __init__(self, max_size: int = None):
+        self.max_size = max_size or Config.VECTORSTORE_POOL_SIZE
+        self._handles: Dict[Hashable, Any] = {}
+        self._collections: "OrderedDict[str, None]" = OrderedDict()
+        self._opening: Dict[Hashable, threading.Lock] = {}
+        self._disk_stamps: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable, factory: Callable[[], Optional[Any]]) -> Optional[Any]:
+        """
+        获取句柄，不存在时调用factory创建
+        
+        factory在池锁之外执行，打开慢的collection不会阻塞其他collection的命中和打开；
+        同一个键同时只有一个线程在打开，其余线程等它完成后直接复用。
+        
+        Args:
+            key: 句柄键，约定为 (persist_dir, collection_name)
+            factory: 创建句柄的函数，返回None表示创建失败（不缓存）
+            
+        Returns:
+            句柄实例或None
+        """
+        handle = self._lookup(key)
+        if handle is not None:
+            return handle
+        
+        with self._lock:
+            self.misses += 1
+            opening = self._opening.setdefault(key, threading.Lock())
+        generation = self.generation(key[1])
+        
+        with opening:
+            handle = self._lookup(key, count_hit=False)
+            if handle is not None:
+                return handle
+            
+            try:
+                handle = factory()
+            except Exception:
+                with self._lock:
+                    self._opening.pop(key, None)
+                raise
+            
+            stamp = _disk_stamp(key[1])
+            with self._lock:
+                self._opening.pop(key, None)
+                # 打开期间collection被失效，旧数据的句柄只给本次调用使用
+                if handle is not None and self._generations.get(key[1], 0) == generation[0] \
+                        and stamp == generation[1]:
+                    if self._disk_stamps.get(key[1], generation[1]) != generation[1]:
+                        self._drop(key[1])
+                    self._disk_stamps[key[1]] = generation[1]
+                    self._handles[key] = handle
+                    self._touch(key[1])
+                    self._evict()
+            
+            return handle
+    
+    def _lookup(self, key: Hashable, count_hit: bool = True) -> Optional[Any]:
+        stamp = _disk_stamp(key[1])
+        with self._lock:
+            handle = self._handles.get(key)
+            if handle is not None and self._disk_stamps.get(key[1]) != stamp:
+                # 其他进程重建了该collection
+                self._drop(key[1])
+                logger.info(f"collection已在其他进程中更新，重新打开句柄: {key[1]}")
+                handle = None
+            if handle is not None:
+                self._touch(key[1])
+                if count_hit:
+                    self.hits += 1
+            return handle
+    
+    def _touch(self, collection_name: str):
+        self._collections[collection_name] = None
+        self._collections.move_to_end(collection_name)
+    
+    def _drop(self, collection_name: str):
+        for key in [key for key in self._handles if key[1] == collection_name]:
+            del self._handles[key]
+        self._collections.pop(collection_name, None)
+        self._disk_stamps.pop(collection_name, None)
+    
+    def _evict(self):
+        while len(self._collections) > self.max_size:
+            evicted = next(iter(self._collections))
+            self._drop(evicted)
+            self.evictions += 1
+            logger.info(f"句柄池已满，淘汰collection句柄: {evicted}")
+    
+    def invalidate(self, collection_name: str, persist_dir: str = None, broadcast: bool = True):
+        """
+        使指定collection的句柄失效（重建、删除或增量写入后调用），并递增代数
+        
+        broadcast为True时替换磁盘标记，通知其他进程；只是发现collection已不存在时
+        无需通知（其他进程同样会发现），传False避免每次查询都写文件。
+        标记文件的写入和stat都在池锁之外进行。
+        """
+        if broadcast:
+            _touch_marker(collection_name)
+        stamp = _disk_stamp(collection_name)
+        
+        with self._lock:
+            self._generations[collection_name] = self._generations.get(collection_name, 0) + 1
+            stale_keys = [
+                key for key in self._handles
+                if key[1] == collection_name and (persist_dir is None or key[0] == persist_dir)
+            ]
+            for key in stale_keys:
+                del self._handles[key]
+            
+            if any(key[1] == collection_name for key in self._handles):
+                # 未失效的其他句柄（只重建了一种索引时）沿用新标记
+                self._disk_stamps[collection_name] = stamp
+            else:
+                self._collections.pop(collection_name, None)
+                self._disk_stamps.pop(collection_name, None)
+        
+        if stale_keys:
+            logger.info(f"已失效collection句柄: {collection_name}")
+    
+    def generation(self, collection_name: str) -> Tuple[int, Optional[Tuple[int, int]]]:
+        """collection的当前代数：(进程内invalidate次数, 磁盘标记)，任一变化即表示collection已更新"""
+        stamp = _disk_stamp(collection_name)
+        with self._lock:
+            return (self._generations.get(collection_name, 0), stamp)
+    
+    def clear(self):
+        """清空句柄池"""
+        with self._lock:
+            self._handles.clear()
+            self._collections.clear()
+            self._disk_stamps.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """句柄池统计信息"""
+        with self._lock:
+            return {
+                "size": len(self._collections),
+                "handles": len(self._handles),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "collections": list(self._collections)
+            }
+
+# 全局句柄池实例
+collection_pool = CollectionHandlePool()
@@ -0,0 +1,39 @@
+"""按长度分桶编码 - 长度相近的文本放在同一批，减少补齐（padding）浪费的计算"""
+from typing import Callable, List, Sequence, Tuple
+
+def length_sorted_batches(texts: Sequence[str], batch_size: int, offset: int = 0) -> List[List[int]]:
+    """
+    按文本长度排序后切批
+
+    Args:
+        texts: 文本
+        batch_size: 每批文本数
+        offset: 返回下标的起始偏移（对长列表的一段分桶时使用）
+
+    Returns:
+        每批文本在原列表中的下标
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    return [
+        [offset + i for i in order[start:start + batch_size]]
+        for start in range(0, len(order), batch_size)
+    ]
+
+def padding_efficiency(lengths: Sequence[int]) -> Tuple[int, int]:
+    """一批文本的 (有效长度之和, 补齐到最长文本后的总长度)，按字符数近似token数"""
+    return sum(lengths), max(lengths, default=0) * len(lengths)
+
+def encode_bucketed(encode: Callable[[List[str]], Sequence], texts: Sequence[str], batch_size: int) -> List:
+    """
+    分桶编码后按原顺序还原
+
+    Args:
+        encode: 编码一批文本的函数
+        texts: 文本
+        batch_size: 每批文本数
+    """
+    results = [None] * len(texts)
+    for batch in length_sorted_batches(texts, batch_size):
+        for i, vector in zip(batch, encode([texts[i] for i in batch])):
+            results[i] = vector
+    return results
@@ -0,0 +1,197 @@
+"""BM25倒排索引 - 中文分词，磁盘紧凑存储，查询时内存映射"""
+import json
+import os
+import re
+import shutil
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from loguru import logger
+from ..utils.config import Config
+
+try:
+    import jieba
+    jieba.setLogLevel(60)
+    JIEBA_AVAILABLE = True
+except ImportError:
+    JIEBA_AVAILABLE = False
+    logger.warning("jieba未安装，BM25索引将使用字二元组分词")
+
+_TOKEN_PATTERN = re.compile(r'[一-鿿]+|[a-z0-9]+(?:\.[0-9]+)?')
+_CJK_PATTERN = re.compile(r'[一-鿿]')
+
+# 提问常用的虚词，几乎每个文档都会命中，只增加累加开销
+STOPWORDS = {
+    "的", "是", "了", "和", "与", "及", "在", "有", "为", "什么", "哪些", "如何",
+    "怎么", "怎样", "为什么", "请", "吗", "呢", "一下", "介绍", "简述"
+}
+
+def tokenize(text: str) -> List[str]:
+    """
+    中文分词
+
+    有jieba时使用搜索引擎模式（"相对危险度"切出"相对"、"危险"、"危险度"）；
+    否则对中文片段使用字二元组。英文和数字按词切分，标点和停用词丢弃。
+    """
+    text = text.lower()
+    tokens = []
+    for segment in _TOKEN_PATTERN.findall(text):
+        if not _CJK_PATTERN.match(segment):
+            tokens.append(segment)
+        elif JIEBA_AVAILABLE:
+            tokens.extend(t for t in jieba.lcut_for_search(segment) if t not in STOPWORDS)
+        elif len(segment) == 1:
+            if segment not in STOPWORDS:
+                tokens.append(segment)
+        else:
+            tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+    return tokens
+
+class LexicalIndex:
+    """
+    BM25倒排索引
+
+    磁盘格式（一个目录）：
+        vocab.json     词 -> 词号
+        meta.json      文档数、平均长度、BM25参数
+        offsets.npy    int64[V+1]，词号对应的倒排表区间
+        postings.npy   int32[P]，文档号
+        weights.npy    float32[P]，预先算好的BM25权重，查询时只需累加
+        docs.json      文档号 -> 内容和元数据
+    数值数组以mmap方式加载，多个进程共享页缓存。
+    """
+
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, "vocab.json"), 'r', encoding='utf-8') as f:
+            self.vocab: Dict[str, int] = json.load(f)
+        with open(os.path.join(index_dir, "meta.json"), 'r', encoding='utf-8') as f:
+            self.meta: Dict[str, Any] = json.load(f)
+        self.offsets = np.load(os.path.join(index_dir, "offsets.npy"), mmap_mode='r')
+        self.postings = np.load(os.path.join(index_dir, "postings.npy"), mmap_mode='r')
+        self.weights = np.load(os.path.join(index_dir, "weights.npy"), mmap_mode='r')
+        self.doc_count = self.meta["doc_count"]
+        self._docs: Optional[List[Dict[str, Any]]] = None
+
+    @classmethod
+    def build(cls,
+              index_dir: str,
+              texts: List[str],
+              metadatas: List[Dict[str, Any]]) -> "LexicalIndex":
+        """
+        从文本块构建索引并写入磁盘
+
+        Args:
+            index_dir: 索引目录（已存在则覆盖）
+            texts: 文本块内容
+            metadatas: 文本块元数据
+
+        Returns:
+            加载好的索引
+        """
+        doc_terms = [Counter(tokenize(text)) for text in texts]
+        doc_lens = np.array([sum(terms.values()) for terms in doc_terms], dtype=np.float32)
+        doc_count = len(texts)
+        avgdl = float(doc_lens.mean()) if doc_count else 0.0
+
+        # 词 -> [(文档号, 词频)]
+        inverted: Dict[str, List[Tuple[int, int]]] = {}
+        for doc_id, terms in enumerate(doc_terms):
+            for term, tf in terms.items():
+                inverted.setdefault(term, []).append((doc_id, tf))
+
+        vocab = {term: i for i, term in enumerate(sorted(inverted))}
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        postings = []
+        weights = []
+        for term, term_id in vocab.items():
+            entries = inverted[term]
+            df = len(entries)
+            idf = np.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+            ids = np.array([doc_id for doc_id, _ in entries], dtype=np.int32)
+            tfs = np.array([tf for _, tf in entries], dtype=np.float32)
+            norm = cls.K1 * (1 - cls.B + cls.B * doc_lens[ids] / max(avgdl, 1e-6))
+            postings.append(ids)
+            weights.append((idf * tfs * (cls.K1 + 1) / (tfs + norm)).astype(np.float32))
+            offsets[term_id + 1] = offsets[term_id] + df
+
+        if os.path.exists(index_dir):
+            shutil.rmtree(index_dir)
+        os.makedirs(index_dir, exist_ok=True)
+
+        np.save(os.path.join(index_dir, "offsets.npy"), offsets)
+        np.save(os.path.join(index_dir, "postings.npy"),
+                np.concatenate(postings) if postings else np.zeros(0, dtype=np.int32))
+        np.save(os.path.join(index_dir, "weights.npy"),
+                np.concatenate(weights) if weights else np.zeros(0, dtype=np.float32))
+        with open(os.path.join(index_dir, "vocab.json"), 'w', encoding='utf-8') as f:
+            json.dump(vocab, f, ensure_ascii=False)
+        with open(os.path.join(index_dir, "meta.json"), 'w', encoding='utf-8') as f:
+            json.dump({
+                "doc_count": doc_count,
+                "avgdl": avgdl,
+                "k1": cls.K1,
+                "b": cls.B,
+                "tokenizer": "jieba" if JIEBA_AVAILABLE else "bigram"
+            }, f)
+        with open(os.path.join(index_dir, "docs.json"), 'w', encoding='utf-8') as f:
+            json.dump(
+                [{"content": text, "metadata": metadata} for text, metadata in zip(texts, metadatas)],
+                f, ensure_ascii=False
+            )
+
+        logger.info(f"BM25索引构建完成: {doc_count} 个文档, {len(vocab)} 个词, 目录 {index_dir}")
+        return cls(index_dir)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """
+        BM25检索
+
+        Returns:
+            [(文档号, BM25分数)]，按分数降序
+        """
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        if not term_ids or not self.doc_count:
+            return []
+
+        scores = np.zeros(self.doc_count, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            # 同一词的倒排表内文档号不重复，可以直接向量化累加
+            scores[self.postings[start:end]] += self.weights[start:end]
+
+        k = min(top_k, self.doc_count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+    def get_document(self, doc_id: int) -> Dict[str, Any]:
+        """按文档号取内容和元数据（首次调用时加载docs.json）"""
+        if self._docs is None:
+            with open(os.path.join(self.index_dir, "docs.json"), 'r', encoding='utf-8') as f:
+                self._docs = json.load(f)
+        return self._docs[doc_id]
+
+def lexical_index_dir(collection_name: str) -> str:
+    """collection对应的BM25索引目录"""
+    return os.path.join(Config.LEXICAL_INDEX_PATH, collection_name)
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> Dict[str, float]:
+    """
+    倒数排名融合（RRF）
+
+    Args:
+        rankings: 多路检索结果，每路为按相关度降序的文档键列表
+        k: 平滑常数
+
+    Returns:
+        文档键 -> 融合分数
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+    return fused
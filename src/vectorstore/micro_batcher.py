@@ -0,0 +1,197 @@
+"""动态微批处理 - 合并并发的编码请求，一次前向计算后分发结果"""
+import asyncio
+import threading
+import time
+from concurrent.futures import Future
+from queue import Empty, Queue
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+from ..utils.config import Config
+
+def _cumulative(bounds: Tuple[float, ...], counts: List[int]) -> Dict[str, int]:
+    """把各桶计数转成累计直方图"""
+    histogram = {}
+    cumulative = 0
+    for bound, count in zip(bounds, counts):
+        cumulative += count
+        histogram["+Inf" if bound == float("inf") else str(bound)] = cumulative
+    return histogram
+
+class MicroBatcher:
+    """
+    动态微批处理器（线程安全，可在asyncio中await）
+
+    请求进入同一队列，后台线程取出第一个请求后最多再等max_wait_ms，
+    把陆续到达的请求合并到max_batch条文本以内，调用一次encode后按请求拆分结果。
+    单个请求超过max_batch时单独编码。记录每批文本数和每个请求排队时间的直方图。
+    encode同步等待结果的时限为timeout秒（None表示不限）。
+    """
+
+    # 每批文本数直方图的桶上限
+    BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, float("inf"))
+    # 排队等待时间直方图的桶上限（毫秒）
+    WAIT_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 500.0, float("inf"))
+
+    def __init__(self,
+                 encode: Callable[[List[str]], Sequence],
+                 max_batch: int,
+                 max_wait_ms: float,
+                 name: str = "micro-batcher",
+                 timeout: float = None):
+        self.encode_batch = encode
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.timeout = timeout
+        self.name = name
+        self._queue: "Queue[Tuple[List[str], Future, float]]" = Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.batches = 0
+        self.requests = 0
+        self.texts = 0
+        self._batch_counts = [0] * len(self.BATCH_BUCKETS)
+        self._wait_counts = [0] * len(self.WAIT_BUCKETS)
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def submit(self, texts: List[str]) -> Future:
+        """提交一个请求，返回在结果就绪时完成的Future"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._thread.start()
+        future = Future()
+        self._queue.put((list(texts), future, time.perf_counter()))
+        return future
+
+    def encode(self, texts: List[str], timeout: float = None) -> Sequence:
+        """同步编码（阻塞到所在批次完成，超过timeout秒抛出TimeoutError，默认使用构造时的timeout）"""
+        return self.submit(texts).result(timeout=timeout if timeout is not None else self.timeout)
+
+    async def encode_async(self, texts: List[str]) -> Sequence:
+        """在事件循环中等待编码结果，不阻塞其他协程"""
+        return await asyncio.wrap_future(self.submit(texts))
+
+    def _loop(self):
+        while True:
+            try:
+                pending = [self._queue.get()]
+                size = len(pending[0][0])
+                deadline = time.perf_counter() + self.max_wait
+                while size < self.max_batch:
+                    timeout = deadline - time.perf_counter()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=timeout)
+                    except Empty:
+                        break
+                    pending.append(item)
+                    size += len(item[0])
+                self._run(pending)
+            except Exception as e:
+                # 单个批次出错不能让处理线程退出，否则之后的请求全部挂起
+                logger.error(f"{self.name} 批处理出错: {e}")
+
+    def _run(self, pending: List[Tuple[List[str], Future, float]]):
+        # 调用方已取消（如await被取消）的请求不再编码，也不能再设置结果
+        pending = [item for item in pending if item[1].set_running_or_notify_cancel()]
+        if not pending:
+            return
+        started = time.perf_counter()
+        texts = [text for request_texts, _, _ in pending for text in request_texts]
+        self._record(len(texts), [(started - enqueued) * 1000 for _, _, enqueued in pending])
+
+        try:
+            vectors = self.encode_batch(texts) if texts else []
+        except Exception as e:
+            for _, future, _ in pending:
+                future.set_exception(e)
+            return
+
+        offset = 0
+        for request_texts, future, _ in pending:
+            future.set_result(vectors[offset:offset + len(request_texts)])
+            offset += len(request_texts)
+
+    def _record(self, batch_size: int, waits_ms: List[float]):
+        with self._lock:
+            self.batches += 1
+            self.requests += len(waits_ms)
+            self.texts += batch_size
+            for i, bound in enumerate(self.BATCH_BUCKETS):
+                if batch_size <= bound:
+                    self._batch_counts[i] += 1
+                    break
+            for wait in waits_ms:
+                for i, bound in enumerate(self.WAIT_BUCKETS):
+                    if wait <= bound:
+                        self._wait_counts[i] += 1
+                        break
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+
+    def stats(self) -> Dict[str, Any]:
+        """合批指标（直方图为累计计数）"""
+        with self._lock:
+            return {
+                "max_batch": self.max_batch,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self.batches,
+                "requests": self.requests,
+                "texts": self.texts,
+                "avg_batch_texts": self.texts / self.batches if self.batches else 0.0,
+                "avg_batch_requests": self.requests / self.batches if self.batches else 0.0,
+                "batch_size": _cumulative(self.BATCH_BUCKETS, self._batch_counts),
+                "queue_wait_ms": {
+                    "count": self.requests,
+                    "avg": self._wait_total / self.requests if self.requests else 0.0,
+                    "max": self._wait_max,
+                    "buckets": _cumulative(self.WAIT_BUCKETS, self._wait_counts)
+                }
+            }
+
+class BatchedQueryEmbeddings(Embeddings):
+    """查询编码经微批处理与其他并发请求合并，文档编码直接透传"""
+
+    def __init__(self, embeddings: Embeddings, batcher: MicroBatcher):
+        self.embeddings = embeddings
+        self.batcher = batcher
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return list(self.batcher.encode([text])[0])
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return [list(vector) for vector in self.batcher.encode(texts)]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return list((await self.batcher.encode_async([text]))[0])
+
+# 查询编码微批处理器，每个模型实例一个
+_query_batchers: Dict[int, MicroBatcher] = {}
+_query_batchers_lock = threading.Lock()
+
+def query_batcher(embeddings: Embeddings) -> MicroBatcher:
+    """获取模型实例对应的查询微批处理器（同一进程内共享同一模型的请求合并在一起）"""
+    with _query_batchers_lock:
+        batcher = _query_batchers.get(id(embeddings))
+        if batcher is None:
+            batcher = MicroBatcher(
+                embeddings.embed_documents,
+                Config.QUERY_BATCH_MAX_SIZE,
+                Config.QUERY_BATCH_MAX_WAIT_MS,
+                name="query-batcher",
+                timeout=Config.QUERY_BATCH_TIMEOUT
+            )
+            _query_batchers[id(embeddings)] = batcher
+        return batcher
+
+def query_batcher_stats() -> List[Dict[str, Any]]:
+    """所有查询微批处理器的指标"""
+    with _query_batchers_lock:
+        batchers = list(_query_batchers.values())
+    return [batcher.stats() for batcher in batchers]
@@ -0,0 +1,171 @@
+"""查询向量缓存 - 内存LRU + 可选的SQLite持久层"""
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from loguru import logger
+from ..utils.config import Config
+
+def normalize_query(text: str) -> str:
+    """
+    归一化问题文本，使"什么是队列研究？"与"什么是队列研究"命中同一条缓存
+
+    全角转半角、统一小写、压缩空白、去掉末尾标点
+    """
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.rstrip('?？。.!！ ')
+
+class QueryEmbeddingCache:
+    """
+    查询向量缓存
+
+    键为 (Embedding模型, 归一化后的问题)。内存层为有界LRU；
+    配置了persist_path时，未命中内存的查询会再查SQLite持久层，重启后仍然有效。
+    内存层和持久层各用一把锁，磁盘读写不会阻塞内存层的命中。
+    """
+
+    def __init__(self, max_size: int = None, persist_path: str = None):
+        self.max_size = max_size if max_size is not None else Config.QUERY_CACHE_SIZE
+        self.persist_path = persist_path if persist_path is not None else Config.QUERY_CACHE_PATH
+        self._memory: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._conn = self._open_disk_tier(self.persist_path) if self.persist_path else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _open_disk_tier(self, path: str) -> Optional[sqlite3.Connection]:
+        """打开SQLite持久层"""
+        try:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "model TEXT NOT NULL, query TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, query))"
+            )
+            conn.commit()
+            logger.info(f"查询向量缓存持久层: {path}")
+            return conn
+        except Exception as e:
+            logger.warning(f"查询向量缓存持久层打开失败，仅使用内存缓存: {e}")
+            return None
+
+    def get(self, model_name: str, query: str) -> Optional[List[float]]:
+        """查询缓存，未命中返回None"""
+        key = (model_name, normalize_query(query))
+
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return vector
+
+        if self._conn is not None:
+            with self._disk_lock:
+                row = self._conn.execute(
+                    "SELECT vector FROM query_embeddings WHERE model = ? AND query = ?",
+                    key
+                ).fetchone()
+            if row is not None:
+                vector = array('f', row[0]).tolist()
+                with self._lock:
+                    self._put_memory(key, vector)
+                    self.disk_hits += 1
+                return vector
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, model_name: str, query: str, vector: List[float]):
+        """写入缓存（内存层和持久层）"""
+        key = (model_name, normalize_query(query))
+
+        with self._lock:
+            self._put_memory(key, list(vector))
+
+        # 持久层写入（含commit的fsync）不占用缓存锁，避免其他查询的内存命中排队等磁盘
+        if self._conn is not None:
+            with self._disk_lock:
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO query_embeddings (model, query, vector) VALUES (?, ?, ?)",
+                        (key[0], key[1], array('f', vector).tobytes())
+                    )
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"查询向量写入持久层失败: {e}")
+
+    def _put_memory(self, key: Tuple[str, str], vector: List[float]):
+        if self.max_size <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def clear(self):
+        """清空内存层（持久层保留）"""
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """命中统计"""
+        with self._lock:
+            total = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._memory),
+                "max_size": self.max_size,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / total if total else 0.0,
+                "persistent": self._conn is not None
+            }
+
+class CachedQueryEmbeddings(Embeddings):
+    """在查询编码前加一层缓存的Embeddings包装，文档编码直接透传"""
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: QueryEmbeddingCache = None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache or query_embedding_cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.cache.get(self.model_name, text)
+        if vector is None:
+            vector = self.embeddings.embed_query(text)
+            self.cache.put(self.model_name, text, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """批量编码查询：先查缓存，未命中的问题合并成一次前向计算"""
+        vectors: List[Optional[List[float]]] = [self.cache.get(self.model_name, text) for text in texts]
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            # HuggingFaceEmbeddings的查询和文档编码方式相同，可以直接走批量接口；
+            # 内层是微批处理包装时走它的查询接口，与其他并发请求合并
+            encode = getattr(self.embeddings, "embed_queries", self.embeddings.embed_documents)
+            encoded = encode([texts[i] for i in missing])
+            for i, vector in zip(missing, encoded):
+                vectors[i] = vector
+                self.cache.put(self.model_name, texts[i], vector)
+        return vectors
+
+# 全局查询向量缓存
+query_embedding_cache = QueryEmbeddingCache()
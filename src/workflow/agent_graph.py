@@ -7,6 +7,9 @@ from ..agents.query_parser import QueryParserAgent
 from ..agents.version_validator import VersionValidatorAgent
 from ..agents.retriever import RetrieverAgent
 from ..agents.answer_generator import AnswerGeneratorAgent
+from ..utils.config import Config
+from .answer_cache import answer_cache
+from .warmup import CollectionWarmer
 
 # ===== 状态定义 =====
 class AgentState(TypedDict):
@@ -26,6 +29,15 @@ class AgentState(TypedDict):
     collection_name: str
     book_metadata: dict
     
+    # 跨书检索（综合类Agent）
+    search_books: list  # 需要一起检索的书名
+    collection_names: list  # 对应的collection，多于一个时并发检索
+    
+    # 语义答案缓存
+    question_embedding: list
+    cache_generations: tuple  # 查缓存时各collection的代数，写缓存时校验
+    from_cache: bool
+    
     # 检索结果
     retrieved_docs: list
     
@@ -41,6 +53,9 @@ version_validator = VersionValidatorAgent()
 retriever = RetrieverAgent()
 answer_generator = AnswerGeneratorAgent()
 
+# 全局预热器
+collection_warmer = CollectionWarmer(retriever, version_validator)
+
 # ===== Agent节点函数 =====
 def parse_query_node(state: AgentState) -> AgentState:
     """节点1: 解析查询"""
@@ -110,6 +125,64 @@ def validate_version_node(state: AgentState) -> AgentState:
         state["is_valid"] = False
         state["error"] = f"版本验证失败: {str(e)}"
     
+    if state.get("search_books"):
+        _resolve_search_collections(state)
+    
+    return state
+
+def _resolve_search_collections(state: AgentState):
+    """综合类Agent：问题中没有指明书籍时，把需要一起检索的书解析为各自最新版本的collection"""
+    # 问题已指明书籍和版本时只检索该书，避免其他教材的段落排在前面
+    if state.get("is_valid") and state.get("collection_name"):
+        state["collection_names"] = [state["collection_name"]]
+        return
+    
+    collection_names = []
+    for book_name in state["search_books"]:
+        try:
+            collection_name = version_validator.get_latest_collection_name(book_name)
+        except Exception as e:
+            logger.warning(f"无法确定《{book_name}》的collection: {e}")
+            continue
+        if collection_name and collection_name not in collection_names:
+            collection_names.append(collection_name)
+    
+    state["collection_names"] = collection_names
+    
+    if collection_names:
+        state["is_valid"] = True
+        state["error"] = ""
+        state["collection_name"] = collection_names[0]
+        state["book_name"] = "、".join(state["search_books"])
+        state["book_metadata"] = {}
+    
+    logger.info(f"  - 跨书检索: {collection_names}")
+
+def _cache_collections(state: AgentState) -> list:
+    return state.get("collection_names") or [state["collection_name"]]
+
+def cache_lookup_node(state: AgentState) -> AgentState:
+    """缓存节点: 查询语义答案缓存，近义问题直接返回已生成的答案"""
+    if not Config.ANSWER_CACHE_ENABLED:
+        return state
+    
+    collection_names = _cache_collections(state)
+    try:
+        state["cache_generations"] = answer_cache.generations(collection_names)
+        # 问题向量经过查询向量缓存，检索时不会重复编码
+        state["question_embedding"] = retriever.vectorstore_builder.embed_queries([state["question"]])[0]
+        cached = answer_cache.lookup(collection_names, state["question_embedding"])
+    except Exception as e:
+        logger.warning(f"答案缓存查询失败，继续检索: {e}")
+        return state
+    
+    if cached:
+        state["answer"] = cached["answer"]
+        state["sources"] = cached["sources"]
+        state["confidence"] = cached["confidence"]
+        state["from_cache"] = True
+        logger.info(f"✓ 命中答案缓存: 「{cached['question']}」(相似度: {cached['similarity']:.4f})")
+    
     return state
 
 def retrieve_docs_node(state: AgentState) -> AgentState:
@@ -123,11 +196,18 @@ def retrieve_docs_node(state: AgentState) -> AgentState:
     version = state["version"]
     
     try:
-        docs = retriever.retrieve(
-            collection_name=collection_name,
-            question=question,
-            version=version
-        )
+        collection_names = state.get("collection_names") or []
+        if len(collection_names) > 1:
+            docs = retriever.retrieve_across(
+                collection_names=collection_names,
+                question=question
+            )
+        else:
+            docs = retriever.retrieve(
+                collection_name=collection_name,
+                question=question,
+                version=version
+            )
         
         state["retrieved_docs"] = docs
         
@@ -177,6 +257,18 @@ def generate_answer_node(state: AgentState) -> AgentState:
         logger.info(f"  - 置信度: {result['confidence']:.2%}")
         logger.info(f"  - 引用来源: {len(result['sources'])} 处")
         
+        # 只缓存基于检索内容生成的答案
+        if Config.ANSWER_CACHE_ENABLED and retrieved_docs and state.get("question_embedding"):
+            answer_cache.put(
+                _cache_collections(state),
+                state["question_embedding"],
+                question,
+                result["answer"],
+                result["sources"],
+                result["confidence"],
+                generations=state.get("cache_generations")
+            )
+        
     except Exception as e:
         logger.error(f"✗ 答案生成失败: {e}")
         state["answer"] = "抱歉，生成答案时出现错误。"
@@ -200,10 +292,16 @@ def handle_error_node(state: AgentState) -> AgentState:
     return state
 
 # ===== 路由函数 =====
-def should_continue_after_validation(state: AgentState) -> Literal["retrieve", "error"]:
+def should_continue_after_validation(state: AgentState) -> Literal["cache", "error"]:
     """判断验证后是否继续"""
     if state.get("error") or not state.get("is_valid"):
         return "error"
+    return "cache"
+
+def should_continue_after_cache(state: AgentState) -> Literal["retrieve", "hit"]:
+    """命中答案缓存时直接结束"""
+    if state.get("from_cache"):
+        return "hit"
     return "retrieve"
 
 def should_continue_after_retrieval(state: AgentState) -> Literal["generate", "error"]:
@@ -221,6 +319,7 @@ def build_workflow():
     # 添加节点
     workflow.add_node("parse", parse_query_node)
     workflow.add_node("validate", validate_version_node)
+    workflow.add_node("cache", cache_lookup_node)
     workflow.add_node("retrieve", retrieve_docs_node)
     workflow.add_node("generate", generate_answer_node)
     workflow.add_node("error", handle_error_node)
@@ -235,11 +334,20 @@ def build_workflow():
         "validate",
         should_continue_after_validation,
         {
-            "retrieve": "retrieve",
+            "cache": "cache",
             "error": "error"
         }
     )
     
+    workflow.add_conditional_edges(
+        "cache",
+        should_continue_after_cache,
+        {
+            "retrieve": "retrieve",
+            "hit": END
+        }
+    )
+    
     workflow.add_conditional_edges(
         "retrieve",
         should_continue_after_retrieval,
@@ -262,12 +370,29 @@ class TextbookAssistant:
         self.app = build_workflow()
         logger.info("课本助手初始化完成")
     
-    def query(self, user_query: str) -> dict:
+    def warm_up(self, books: list) -> bool:
+        """
+        后台预热热门collection
+        
+        Args:
+            books: 按热度降序的 (书名, 版本) 列表，版本为空表示最新版
+            
+        Returns:
+            是否启动了新的预热
+        """
+        return collection_warmer.start(books)
+    
+    def warmup_progress(self) -> dict:
+        """预热进度（就绪检查使用）"""
+        return collection_warmer.progress()
+    
+    def query(self, user_query: str, search_books: list = None) -> dict:
         """
         处理用户查询
         
         Args:
             user_query: 用户查询
+            search_books: 需要一起检索的书名（综合类Agent），多本书时并发检索后合并
             
         Returns:
             {
@@ -275,7 +400,8 @@ class TextbookAssistant:
                 "sources": list,
                 "confidence": float,
                 "book_name": str,
-                "version": str
+                "version": str,
+                "from_cache": bool  # 是否命中语义答案缓存
             }
         """
         logger.info(f"\n{'='*60}")
@@ -293,6 +419,11 @@ class TextbookAssistant:
             "validation_message": "",
             "collection_name": "",
             "book_metadata": {},
+            "search_books": search_books or [],
+            "collection_names": [],
+            "question_embedding": [],
+            "cache_generations": (),
+            "from_cache": False,
             "retrieved_docs": [],
             "answer": "",
             "sources": [],
@@ -313,7 +444,8 @@ class TextbookAssistant:
             "confidence": result["confidence"],
             "book_name": result["book_name"],
             "version": result["version"],
-            "question": result["question"]
+            "question": result["question"],
+            "from_cache": result.get("from_cache", False)
         }
 
 # 测试代码